@@ -1,16 +1,25 @@
-import httpx
+from session_manager import borrow_client, log_pool_stats
 from bs4 import BeautifulSoup
 import logging
+from log_setup import setup_logging
 import asyncio
 from login import login
+from config import GAME_URL
+from tokens import extract_input_value
+from streaming import fetch_until, until_input
+from limiter import limiter
+from shop import is_rejected
+from training import TrainingExecutor
+from forms import RAID_FORM
+from metrics import registry, start_dumping, VERBOSE
 import random
 # Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging()
 
 
 async def get_player_villages(cookies, uid, excluded_village_ids):
-    async with httpx.AsyncClient(cookies=cookies, follow_redirects=True) as client:
-        response = await client.get(f"https://fun.gotravspeed.com/profile.php?uid={uid}")
+    async with borrow_client(cookies) as client:
+        response = await client.get(f"{GAME_URL}/profile.php?uid={uid}", follow_redirects=True)
         logging.info(f"Final URL after redirects: {response.url}")
         soup = BeautifulSoup(response.text, 'html.parser')
         village_links = soup.select('#villages a[href*="village3.php?id="]')
@@ -19,7 +28,7 @@ async def get_player_villages(cookies, uid, excluded_village_ids):
             village_id = link['href'].split('=')[-1]
             if village_id not in excluded_village_ids:
                 village_name = link.text.strip()
-                village_url = f"https://fun.gotravspeed.com/v2v.php?id={village_id}"
+                village_url = f"{GAME_URL}/v2v.php?id={village_id}"
                 villages.append((village_name, village_url))
         sorted_villages = sorted(villages, key=lambda x: x[0])
         logging.info(f"Found {len(sorted_villages)} non-capital villages for player {uid} excluding village IDs {excluded_village_ids}")
@@ -30,6 +39,8 @@ import httpx
 from bs4 import BeautifulSoup
 import asyncio
 
+# Sends one raid and returns its outcome: "sent", "no_key", "rejected",
+# "http_<status>" or "error"
 async def attack_village(cookies, village_url):
     try:
         # Derive the village ID from the village URL
@@ -42,7 +53,7 @@ async def attack_village(cookies, village_url):
             "Accept-Language": "en-GB,en-US;q=0.9,en;q=0.8",
             "Accept-Encoding": "gzip, deflate, br",
             "Content-Type": "application/x-www-form-urlencoded",
-            "Origin": "https://fun.gotravspeed.com",
+            "Origin": GAME_URL,
             "Referer": village_url,
             "Sec-Fetch-Dest": "document",
             "Sec-Fetch-Mode": "navigate",
@@ -52,89 +63,78 @@ async def attack_village(cookies, village_url):
         }
 
         # GET request to retrieve the key
-        async with httpx.AsyncClient(cookies=cookies) as client:
-            response = await client.get(village_url, headers=headers)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            key = soup.find('input', {'name': 'key'})['value']
+        async with borrow_client(cookies) as client:
+            async with limiter.acquire("/v2v.php") as slot:
+                response, page, found = await fetch_until(client, village_url, until_input('key'), headers=headers)
+                slot.observe(response)
+                key = extract_input_value(page, 'key')
+                if key is None:
+                    slot.fail()
+                    print(f"Error attacking village with ID {village_id}: key not found")
+                    return "no_key"
 
             # Construct the data for the POST request
-            data = {
-                'id': village_id,
-                'c': '4',  # Attack: raid
-                't[1]': '0',  # Phalanx
-                't[2]': '0',  # Swordsman
-                't[3]': '20.0000000000000000000000e+22',  # Pathfinder
-                't[4]': '0',  # Theutates Thunder
-                't[5]': '0',  # Druidrider
-                't[6]': '20.0000000000000000000000e+22',  # Haeduan
-                't[7]': '0',  # Battering Ram
-                't[8]': '0',  # Trebuchet
-                't[9]': '0',  # Chief
-                't[0]': '0',  # Settler
-                'key': key
-            }
+            data = RAID_FORM.render(id=village_id, key=key)
 
             # POST request to send troops
-            attack_response = await client.post("https://fun.gotravspeed.com/v2v.php", headers=headers, data=data)
-            if attack_response.status_code == 200:
-                print(f"Attacked village with ID {village_id}")
-            else:
+            async with limiter.acquire("/v2v.php") as slot:
+                attack_response = slot.observe(await client.post(f"{GAME_URL}/v2v.php", headers=headers, content=data))
+            if attack_response.status_code != 200:
+                registry.incr("action:raid:failed")
                 print(f"Error attacking village with ID {village_id}: {attack_response.status_code}")
-
-            await asyncio.sleep(0.05)
+                return f"http_{attack_response.status_code}"
+            if is_rejected(attack_response):
+                registry.incr("action:raid:failed")
+                print(f"Error attacking village with ID {village_id}: key rejected")
+                return "rejected"
+            registry.record_action("raid")
+            if VERBOSE:
+                print(f"Attacked village with ID {village_id}")
+            return "sent"
 
     except Exception as e:
         print(f"Error attacking village with ID {village_id}: {e}")
+        return "error"
 
 
-async def train_troops(cookies, village_id):
-    async def send_train_request(session):
-        url = f"https://fun.gotravspeed.com/build.php?id=25"
-        headers = {
-            "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-            "accept-language": "en-US,en;q=0.9",
-            "content-type": "application/x-www-form-urlencoded",
-            "sec-ch-ua": "\"Chromium\";v=\"122\", \"Not(A:Brand\";v=\"24\", \"Google Chrome\";v=\"122\"",
-            "sec-ch-ua-mobile": "?0",
-            "sec-ch-ua-platform": "\"Windows\"",
-            "sec-fetch-dest": "document",
-            "sec-fetch-mode": "navigate",
-            "sec-fetch-site": "same-origin",
-            "sec-fetch-user": "?1",
-            "upgrade-insecure-requests": "1"
-        }
-        data = "tf%5B2%5D=521117636153554570000&s1.x=50&s1.y=8"
-
-        response = await session.post(url, headers=headers, data=data)
-        if response.status_code == 200:
-            logging.info("Training Praetorians in the current village")
-        else:
-            logging.error(f"Error during Praetorians training: {response.status_code}")
-
-    async with httpx.AsyncClient(cookies=cookies) as session:
-        tasks = [send_train_request(session) for _ in range(3)]
-        await asyncio.gather(*tasks)
+# Trains troops in the current village: three submissions, each queueing a
+# batch of its own
+async def train_troops(cookies, village_id, executor=None):
+    async with borrow_client(cookies) as session:
+        executor = executor or TrainingExecutor(session)
+        return await executor.submit_many(3)
 
 async def main():
+    # raids.py and targets.py import this module, so they are imported here
+    from raids import dispatch_raids
+    from targets import TargetRegistry
+
+    dumper = start_dumping()
     cookies = await login()
     uid = 9
     excluded_village_ids = ['9631']
-    villages = await get_player_villages(cookies, uid, excluded_village_ids)
+    # Start from the cached village list; a stale one is refreshed meanwhile
+    targets = TargetRegistry()
+    villages = await targets.get(cookies, uid, excluded_village_ids)
 
     random.shuffle(villages)  # Shuffle the order of villages
 
-    for village in villages:
-        try:
-            logging.info(f"Starting attack on village {village[0]}")
-            await attack_village(cookies, village[1])
-            logging.info(f"Finished attack on village {village[0]}")
-            logging.info(f"Starting training troops in village {village[0]}")
-            train_tasks = [train_troops(cookies, village[1].split('=')[-1]) for _ in range(200)]
-            await asyncio.gather(*train_tasks)
-            logging.info(f"Finished training troops in village {village[0]}")
-        except Exception as e:
-            logging.error(f"Error processing village {village[0]}: {e}")
-        await asyncio.sleep(1)  # Adjust the sleep time as needed
+    # Raid all targets concurrently; troop training runs in its own lane
+    report = await dispatch_raids(cookies, villages)
+    report.save()
+    logging.info(f"Raids: {report.summary()}")
+
+    # Villages that showed up in the refreshed profile get raided as well
+    added, removed = await targets.changes(excluded_village_ids)
+    if added:
+        added_report = await dispatch_raids(cookies, added)
+        logging.info(f"Raids on new villages: {added_report.summary()}")
+
+    log_pool_stats()
+    limiter.log_limits()
+    dumper.cancel()
+    registry.dump()
+    logging.info(f"Metrics:\n{registry.format()}")
 
 
 
@@ -0,0 +1,66 @@
+import sys
+import time
+from pathlib import Path
+from bs4 import BeautifulSoup
+from tokens import extract_input_value, extract_build_token
+
+# Microbenchmark for tokens.py: compares the byte scan against the full
+# BeautifulSoup parse it replaces, over the saved pages in pages/.
+#
+#   python bench_tokens.py [pages_dir] [iterations]
+
+PAGES_DIR = Path(__file__).parent / "pages"
+ITERATIONS = 200
+
+# Saved page -> (scan extractor, equivalent bs4 extraction)
+CASES = {
+    "buy2.html": (
+        lambda page: extract_input_value(page, 'key'),
+        lambda page: BeautifulSoup(page, 'html.parser').find('input', {'name': 'key'})['value']
+    ),
+    "v2v.html": (
+        lambda page: extract_input_value(page, 'key'),
+        lambda page: BeautifulSoup(page, 'html.parser').find('input', {'name': 'key'})['value']
+    ),
+    "v2v_settlers.html": (
+        lambda page: extract_input_value(page, 'k'),
+        lambda page: BeautifulSoup(page, 'html.parser').find('input', {'name': 'k'})['value']
+    ),
+    "build.html": (
+        lambda page: extract_build_token(page),
+        lambda page: BeautifulSoup(page, 'html.parser').find('a', {'class': 'build'})['href'].split('&k=')[-1]
+    ),
+}
+
+
+def time_per_call(func, page, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(page)
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    pages_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else PAGES_DIR
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else ITERATIONS
+
+    print(f"{'page':<20}{'bytes':>8}{'scan us':>12}{'bs4 us':>12}{'saved us':>12}{'speedup':>10}")
+    for name, (scan, parse) in CASES.items():
+        path = pages_dir / name
+        if not path.exists():
+            continue
+        raw = path.read_bytes()
+        text = raw.decode('utf-8')
+        if scan(raw) != parse(text):
+            print(f"{name}: scan and bs4 disagree ({scan(raw)!r} != {parse(text)!r})")
+            continue
+        scan_time = time_per_call(scan, raw, iterations)
+        parse_time = time_per_call(parse, text, max(1, iterations // 10))
+        print(
+            f"{name:<20}{len(raw):>8}{scan_time * 1e6:>12.1f}{parse_time * 1e6:>12.1f}"
+            f"{(parse_time - scan_time) * 1e6:>12.1f}{parse_time / scan_time:>9.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
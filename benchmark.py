@@ -0,0 +1,354 @@
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# End-to-end benchmark suite for the hot paths, run against mock_server.py.
+# Every scenario runs in its own child process, inside a scratch directory
+# whose config.json points loginUrl/gameUrl at a fresh mock server, so the
+# scripts run unchanged and never touch the real config, session or
+# settlements files.
+#
+#   python benchmark.py                            # all scenarios
+#   python benchmark.py production raids --latency 0.02
+#   python benchmark.py --save-baseline            # store bench_baseline.json
+#   python benchmark.py --baseline bench_baseline.json
+
+REPO_DIR = Path(__file__).resolve().parent
+REPORT_FILE = "bench_report.json"
+BASELINE_FILE = "bench_baseline.json"
+
+# A result is a regression when it is this much worse than the baseline
+TOLERANCE = 0.15
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def peak_rss_kb():
+    # The repo's own resource.py shadows the stdlib module, so read /proc
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+# Scenarios run inside the child process. Each returns the number of logical
+# actions it completed, read back from the mock server's game state.
+
+# Request latencies in seconds, timed by the child's clients
+latencies = []
+
+async def scenario_production(options, server_stats):
+    from login import login
+    from resource import increase_production_async
+    cookies = await login()
+    await increase_production_async(options["count"], cookies)
+    return server_stats()["purchases"]["production"]
+
+
+async def scenario_storage(options, server_stats):
+    from login import login
+    from resource import increase_storage_async
+    cookies = await login()
+    await increase_storage_async(options["count"], cookies)
+    return server_stats()["purchases"]["storage"]
+
+
+async def scenario_production_keys(options, server_stats):
+    # Calibrate the key cache against a server that accepts each key 8 times
+    import shop
+    shop.KEY_CALIBRATE = True
+    return await scenario_production(options, server_stats)
+
+
+async def scenario_production_pool(options, server_stats):
+    # Experimental process pool; the workers' latencies are sent back to it
+    from login import login
+    from shop_pool import run_shop_pool
+    cookies = await login()
+    await run_shop_pool("production", options["count"], cookies, processes=options["processes"], latencies=latencies)
+    return server_stats()["purchases"]["production"]
+
+
+async def scenario_combined(options, server_stats):
+    from resource import increase_production_async, increase_storage_async
+    from scheduler import ShopScheduler
+    scheduler = ShopScheduler()
+    scheduler.add("storage", options["count"], increase_storage_async)
+    scheduler.add("production", options["count"], increase_production_async)
+    await scheduler.run()
+    purchases = server_stats()["purchases"]
+    return purchases["storage"] + purchases["production"]
+
+
+async def scenario_celebrations(options, server_stats):
+    from login import login
+    from celebration import celebrate
+    cookies = await login()
+    await celebrate(options["count"], cookies)
+    return server_stats()["celebrations"]
+
+
+async def scenario_raids(options, server_stats):
+    import attack
+    from raids import dispatch_raids
+    cookies = await attack.login()
+    villages = await attack.get_player_villages(cookies, 9, [])
+    await dispatch_raids(cookies, villages, trainings_per_raid=options["trainings"])
+    return server_stats()["raids"]
+
+
+async def scenario_spots(options, server_stats):
+    import villagespots
+    cookies = await villagespots.login()
+    village_ids = villagespots.generate_spiral_village_ids(9625, options["count"])
+    await villagespots.find_empty_village_spots(cookies, village_ids)
+    return len(village_ids)
+
+
+async def scenario_expansion(options, server_stats):
+    # `count` rounds of village2.main's loop: rename, build the latest
+    # village's plan, train settlers and settle (without main's 10s pause)
+    import village2
+    cookies = await village2.login()
+    for _ in range(options["count"]):
+        await village2.expand_once(cookies)
+    return server_stats()["villages"] - 1
+
+
+async def scenario_construction(options, server_stats):
+    # The secondary plan from config.json in `count` villages, `sessions` at once
+    from construction import construct_villages
+    villages = [(9625 + i, "secondary") for i in range(options["count"])]
+    await construct_villages(villages, sessions=options["sessions"])
+    return server_stats()["levels"]
+
+
+async def scenario_capital_plan(options, server_stats):
+    # The 39-entry capital plan in one village, `queue` positions at a time
+    from login import login
+    from session_manager import get_client
+    from plans import run_plan
+    cookies = await login()
+    await run_plan(get_client(cookies), 9625, "capital", queue=options["queue"])
+    return server_stats()["levels"]
+
+
+# name -> (coroutine, default options, mock server arguments, unit, seconds per unit)
+SCENARIOS = {
+    "production": (scenario_production, {"count": 500}, [], "purchases/s", 1),
+    "storage": (scenario_storage, {"count": 500}, [], "purchases/s", 1),
+    "production-keys": (scenario_production_keys, {"count": 500}, ["--key-uses", "8"], "purchases/s", 1),
+    "combined": (scenario_combined, {"count": 500}, [], "purchases/s", 1),
+    # Experimental: slower than "production" against the mock so far
+    "production-pool": (scenario_production_pool, {"count": 2000, "processes": 4}, [], "purchases/s", 1),
+    "celebrations": (scenario_celebrations, {"count": 1000}, ["--culture-points", "1000000000"], "celebrations/s", 1),
+    "raids": (scenario_raids, {"trainings": 20}, ["--villages", "50"], "raids/min", 60),
+    "spots": (scenario_spots, {"count": 1500}, [], "tiles/s", 1),
+    "expansion": (scenario_expansion, {"count": 10}, [], "villages/hour", 3600),
+    "construction": (scenario_construction, {"count": 8, "sessions": 1}, [], "levels/s", 1),
+    # Opt-in: one login per extra session
+    "construction-sessions": (scenario_construction, {"count": 8, "sessions": 8}, [], "levels/s", 1),
+    "capital-plan": (scenario_capital_plan, {"queue": 1}, [], "levels/s", 1),
+    # Four orders at once; the live server's build queue may refuse them
+    "capital-plan-queue4": (scenario_capital_plan, {"queue": 4}, [], "levels/s", 1),
+    "capital-plan-rejects": (scenario_capital_plan, {"queue": 1}, ["--build-reject-rate", "0.05"], "levels/s", 1),
+    # Hypothetical: assumes the server answers upgrades with the building's
+    # page, which the live server is not known to do
+    "capital-plan-chained": (scenario_capital_plan, {"queue": 1}, ["--upgrade-page"], "levels/s", 1),
+}
+
+
+def run_child(name, options):
+    """
+    Runs one scenario in this process against the mock server named in the
+    scratch config.json and prints its result as JSON.
+    """
+    import httpx
+    import session_manager
+    from config import GAME_URL
+
+    scenario = SCENARIOS[name][0]
+
+    async def on_request(request):
+        request.extensions["bench_started"] = time.perf_counter()
+
+    async def on_response(response):
+        started = response.request.extensions.get("bench_started")
+        if started is not None:
+            latencies.append(time.perf_counter() - started)
+
+    def server_stats():
+        return httpx.get(f"{GAME_URL}/_stats").json()
+
+    # Time every client the scenario creates, including extra game sessions
+    create_client = session_manager._create_client
+
+    def create_timed_client(cookies):
+        client = create_client(cookies)
+        client.event_hooks["request"].append(on_request)
+        client.event_hooks["response"].append(on_response)
+        return client
+
+    session_manager._create_client = create_timed_client
+
+    async def run():
+        session_manager.get_client()
+        started = time.perf_counter()
+        actions = await scenario(options, server_stats)
+        elapsed = time.perf_counter() - started
+        await session_manager.close_client()
+        return actions, elapsed
+
+    httpx.post(f"{GAME_URL}/_reset")
+    actions, elapsed = asyncio.run(run())
+    requests = sum(endpoint["requests"] for endpoint in server_stats()["endpoints"].values())
+    unit, scale = SCENARIOS[name][3], SCENARIOS[name][4]
+    result = {
+        "actions": actions,
+        "seconds": round(elapsed, 3),
+        "throughput": round(actions / elapsed * scale, 3) if elapsed else 0.0,
+        "unit": unit,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "requests": requests,
+        "requests_per_action": round(requests / actions, 3) if actions else None,
+        "peak_rss_kb": peak_rss_kb()
+    }
+    print(json.dumps(result))
+
+
+def run_scenario(name, args):
+    scenario, options, server_args, unit, scale = SCENARIOS[name]
+    options = dict(options)
+    if args.count:
+        options["count"] = args.count
+
+    workdir = Path(tempfile.mkdtemp(prefix=f"bench-{name}-"))
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    with open(REPO_DIR / "config.json") as file:
+        config = json.load(file)
+    config["loginUrl"] = url
+    config["gameUrl"] = url
+    with open(workdir / "config.json", "w") as file:
+        json.dump(config, file, indent=4)
+
+    server = subprocess.Popen(
+        [sys.executable, str(REPO_DIR / "mock_server.py"), "--port", str(port),
+         "--latency", str(args.latency), "--error-rate", str(args.error_rate)] + server_args,
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        for _ in range(50):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        env = dict(os.environ, PYTHONPATH=str(REPO_DIR))
+        child = subprocess.run(
+            [sys.executable, str(REPO_DIR / "benchmark.py"), "--child", name, "--options", json.dumps(options)],
+            cwd=workdir, env=env, capture_output=True, text=True
+        )
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if child.returncode != 0:
+        print(child.stderr, file=sys.stderr)
+        return {"error": f"exit code {child.returncode}"}
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+
+def compare(report, baseline, tolerance):
+    regressions = []
+    for name, result in report.items():
+        base = baseline.get(name)
+        if not base or "error" in result or "error" in base:
+            continue
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {result['throughput']} < baseline {base['throughput']} {result['unit']}")
+        if base.get("requests_per_action") and result["requests_per_action"] and \
+                result["requests_per_action"] > base["requests_per_action"] * (1 + tolerance):
+            regressions.append(f"{name}: {result['requests_per_action']} requests/action > baseline {base['requests_per_action']}")
+        if base["p99_ms"] and result["p99_ms"] > base["p99_ms"] * (1 + tolerance) + 1:
+            regressions.append(f"{name}: p99 {result['p99_ms']}ms > baseline {base['p99_ms']}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks against the local mock server")
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--count", type=int, help="override the scenario's action count")
+    parser.add_argument("--latency", type=float, default=0.0, help="mock server latency per request in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="mock server 5xx rate")
+    parser.add_argument("--report", default=REPORT_FILE, help="where to write the JSON report")
+    parser.add_argument("--baseline", help="compare against this report and fail on regressions")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also store the report as {BASELINE_FILE}")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--options", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args.child, json.loads(args.options))
+
+    names = args.scenarios or list(SCENARIOS)
+    report = {}
+    for name in names:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario {name}")
+        result = run_scenario(name, args)
+        report[name] = result
+        if "error" in result:
+            print(f"{name:<12} failed: {result['error']}")
+        else:
+            print(
+                f"{name:<12} {result['throughput']:>10.1f} {result['unit']:<14} "
+                f"p50 {result['p50_ms']:>7.2f}ms  p99 {result['p99_ms']:>7.2f}ms  "
+                f"{result['requests_per_action']} req/action  peak RSS {result['peak_rss_kb']} kB"
+            )
+
+    with open(args.report, "w") as file:
+        json.dump(report, file, indent=4)
+    if args.save_baseline:
+        with open(BASELINE_FILE, "w") as file:
+            json.dump(report, file, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,14 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from bs4 import BeautifulSoup
+from tokens import extract_build_link, extract_build_token, is_fully_upgraded, is_build_page
+from celebration import start_celebrations
+from cookie_bridge import CookieBridge
 from selenium.common.exceptions import NoSuchElementException
 import os
 import time
 import requests
+from config import GAME_URL, LOGIN_URL
 import re
 import logging
 import concurrent.futures
@@ -25,6 +29,15 @@ logging.basicConfig(
 
 session = requests.Session()
 
+# Copies the driver's cookies into `session` after login and only when needed
+bridge = CookieBridge(session)
+
+# Building pages the last upgrade of a position was answered with, on servers
+# that answer upgrades with the page; it carries the next upgrade token. The
+# live server is not known to do this (the original flow reloads build.php
+# after every upgrade), in which case this stays empty and costs nothing
+upgrade_pages = {}
+
 # Configuration
 username = "scar"
 password = "satkabir"
@@ -69,7 +82,7 @@ def check_internet_connection():
 def check_host():
     while True:
         try:
-            response = requests.get("https://www.gotravspeed.com", timeout=5)
+            response = requests.get(LOGIN_URL, timeout=5)
             if response.status_code == 200:
                 logging.info("Host is available")
                 return True
@@ -94,7 +107,7 @@ def accept_cookies():
 def login():
     while True:
         try:
-            driver.get("https://www.gotravspeed.com")
+            driver.get(LOGIN_URL)
             WebDriverWait(driver, 5).until(
                 EC.presence_of_element_located((By.ID, "name"))
             ).send_keys(username)
@@ -110,6 +123,7 @@ def login():
                     (By.XPATH, "//button[contains(@class,'default__button-o-login')]")
                 )
             ).click()
+            bridge.sync(driver)
             return
         except Exception as e:
             print("Error during login:", e)
@@ -120,7 +134,7 @@ def login():
 def navigate_to_construction_page():
     try:
         # Navigate to the construction page with the correct URL format
-        driver.get(f"https://fun.gotravspeed.com/village2.php?=BuildMode=1")
+        driver.get(f"{GAME_URL}/village2.php?=BuildMode=1")
         logging.info("Navigated to construction page and enabled build mode")
     except Exception as e:
         logging.error(f"Error navigating to construction page: {e}")
@@ -131,26 +145,20 @@ def build_building(position_id, building_id, building_name):
         logging.info(
             f"Attempting to build {building_name} (ID: {building_id}) at position {position_id}"
         )
-        # Extract cookies from Selenium and set them in the requests session
-        selenium_cookies = driver.get_cookies()
-        for cookie in selenium_cookies:
-            session.cookies.set(cookie["name"], cookie["value"])
         # Send a GET request to the specific position URL to retrieve the CSRF token
-        position_response = session.get(
-            f"https://fun.gotravspeed.com/build.php?id={position_id}"
+        position_response = bridge.get(
+            f"{GAME_URL}/build.php?id={position_id}"
         )
-        position_soup = BeautifulSoup(position_response.text, "html.parser")
-        build_link = position_soup.find("a", class_="build")
-        if build_link is None:
+        href = extract_build_link(position_response.content)
+        if href is None:
             logging.error("Build link not found in the response")
             # logging.error(f"Response text: {position_response.text}")
             return  # Exit the function if the build link is not found
-        href = build_link["href"]
         csrf_token = href.split("&k=")[-1]
         logging.info(f"Retrieved CSRF token: {csrf_token}")
         # Send a GET request to construct the building
-        build_url = f"https://fun.gotravspeed.com/village2.php?id={position_id}&b={building_id}&k={csrf_token}"
-        build_response = session.get(build_url)
+        build_url = f"{GAME_URL}/village2.php?id={position_id}&b={building_id}&k={csrf_token}"
+        build_response = bridge.get(build_url)
         if build_response.status_code == 200:
             logging.info(
                 f"Successfully built {building_name} (ID: {building_id}) at position {position_id}"
@@ -175,6 +183,8 @@ def build_and_upgrade(position_id, building_id, loop, building_name):
             is_fully_upgraded = upgrade_building(position_id, building_name)
             if is_fully_upgraded:
                 break  # Exit the loop if the building is fully upgraded
+        upgrade_pages.pop(position_id, None)
+        bridge.log_stats()
     except Exception as e:
         logging.error(
             f"Error encountered during build and upgrade for {building_name}: {e}"
@@ -183,28 +193,28 @@ def build_and_upgrade(position_id, building_id, loop, building_name):
 
 def upgrade_building(position_id, building_name):
     try:
-        # Extract cookies from Selenium and set them in the requests session
-        selenium_cookies = driver.get_cookies()
-        for cookie in selenium_cookies:
-            session.cookies.set(cookie["name"], cookie["value"])
-        # Send a GET request to the specific position URL to retrieve the CSRF token and check if the building is fully upgraded
-        position_response = session.get(
-            f"https://fun.gotravspeed.com/build.php?id={position_id}"
+        # Send a GET request to the specific position URL to retrieve the CSRF token and check if the building is fully upgraded,
+        # unless the last upgrade was already answered with that page
+        position_response = upgrade_pages.pop(position_id, None) or bridge.get(
+            f"{GAME_URL}/build.php?id={position_id}"
         )
-        position_soup = BeautifulSoup(position_response.text, "html.parser")
-        csrf_token = position_soup.find("a", {"class": "build"})["href"].split("&k=")[1]
-        build_div = position_soup.find("div", {"id": "build"})
-        if f"Fully" in build_div.text:
+        csrf_token = extract_build_token(position_response.content)
+        if is_fully_upgraded(position_response.content):
             logging.info(f"{building_name} is fully upgraded.")
             return True  # Return True if the building is fully upgraded
+        if csrf_token is None:
+            logging.error(f"Upgrade link not found for {building_name} at position {position_id}")
+            return False
         # Send a GET request to upgrade the building
-        upgrade_response = session.get(
-            f"https://fun.gotravspeed.com/village2.php?id={position_id}&k={csrf_token}"
+        upgrade_response = bridge.get(
+            f"{GAME_URL}/village2.php?id={position_id}&k={csrf_token}"
         )
         if upgrade_response.status_code == 200:
             logging.info(
                 f"Successfully upgraded {building_name} at position {position_id}"
             )
+            if is_build_page(upgrade_response.content):
+                upgrade_pages[position_id] = upgrade_response
         else:
             logging.error(
                 f"Failed to upgrade {building_name} at position {position_id}. Status code: {upgrade_response.status_code}"
@@ -300,16 +310,14 @@ def handle_error():
 
 def train_settlers_concurrently():
     def send_train_request():
-        response = requests.post(
-            url, headers=headers, data=settlers_data, cookies=cookies
-        )
+        response = bridge.post(url, headers=headers, data=settlers_data)
         if response.status_code == 200:
             logging.info("Training Settlers in the current village")
         else:
             logging.error(f"Error during Settlers training: {response.status_code}")
 
     try:
-        url = "https://fun.gotravspeed.com/build.php?id=30"
+        url = f"{GAME_URL}/build.php?id=30"
         headers = {
             "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
             "accept-language": "en-US,en;q=0.9",
@@ -327,7 +335,6 @@ def train_settlers_concurrently():
         settlers_data = (
             "tf%5B10%5D=3&s1.x=50&s1.y=8"  # Set the quantity of settlers to train
         )
-        cookies = {c["name"]: c["value"] for c in driver.get_cookies()}
         with ThreadPoolExecutor(max_workers=1) as executor:
             futures = [executor.submit(send_train_request) for _ in range(1)]
             for future in concurrent.futures.as_completed(futures):
@@ -338,27 +345,32 @@ def train_settlers_concurrently():
 
 def build_or_upgrade_resource(position_id, loop):
     try:
+        position_response = None
         for _ in range(loop):
-            # Extract cookies from Selenium and set them in the requests session
-            selenium_cookies = driver.get_cookies()
-            for cookie in selenium_cookies:
-                session.cookies.set(cookie["name"], cookie["value"])
-            # Send a GET request to the specific position URL to retrieve the CSRF token
-            position_response = session.get(
-                f"https://fun.gotravspeed.com/build.php?id={position_id}"
-            )
-            position_soup = BeautifulSoup(position_response.text, "html.parser")
-            csrf_token = position_soup.find("a", {"class": "build"})["href"].split(
-                "&k="
-            )[1]
+            # Send a GET request to the specific position URL to retrieve the CSRF token,
+            # unless the last upgrade was already answered with that page
+            if position_response is None:
+                position_response = bridge.get(
+                    f"{GAME_URL}/build.php?id={position_id}"
+                )
+            if is_fully_upgraded(position_response.content):
+                logging.info(f"Resource at position {position_id} is fully upgraded.")
+                break
+            csrf_token = extract_build_token(position_response.content)
+            if csrf_token is None:
+                logging.error(f"Upgrade link not found for resource at position {position_id}")
+                break
             # Send a GET request to upgrade the building or field
-            upgrade_response = session.get(
-                f"https://fun.gotravspeed.com/village2.php?id={position_id}&k={csrf_token}"
+            upgrade_response = bridge.get(
+                f"{GAME_URL}/village2.php?id={position_id}&k={csrf_token}"
             )
+            position_response = None
             if upgrade_response.status_code == 200:
                 logging.info(
                     f"Successfully upgraded resource at position {position_id}"
                 )
+                if is_build_page(upgrade_response.content):
+                    position_response = upgrade_response
             else:
                 logging.error(
                     f"Failed to upgrade resource at position {position_id}. Status code: {upgrade_response.status_code}"
@@ -379,7 +391,7 @@ def train_settlers_and_find_new_village():
         time.sleep(1)  # Add a delay to ensure settlers are trained
 
         # Navigate to the Map and find a suitable spot for the new village
-        driver.get("https://fun.gotravspeed.com/map.php")
+        driver.get(f"{GAME_URL}/map.php")
         logging.info("Navigated to Map")
 
         # Create a set of settled village IDs for faster lookup
@@ -388,7 +400,7 @@ def train_settlers_and_find_new_village():
         for village in settlements["villages"]:
             village_id = village["id"]
             if not village["settled"]:  # Check if the village is not settled
-                driver.get(f"https://fun.gotravspeed.com/village3.php?id={village_id}")
+                driver.get(f"{GAME_URL}/village3.php?id={village_id}")
                 logging.info(f"Checking village ID {village_id} for suitability")
                 if "building a new village" in driver.page_source:
                     logging.info(f"Found a suitable spot for a new village at ID {village_id}")
@@ -431,7 +443,7 @@ def train_settlers_and_find_new_village():
 
 def switch_to_0000_village():
     try:
-        driver.get("https://fun.gotravspeed.com/village1.php?vid=5231")
+        driver.get(f"{GAME_URL}/village1.php?vid=5231")
         logging.info("Switched to the 0000 village")
     except Exception as e:
         logging.error(f"Error switching to the 0000 village: {e}")
@@ -439,7 +451,7 @@ def switch_to_0000_village():
 
 def rename_village(village_id, village_name):
     # Navigate to the profile page
-    driver.get(f"https://fun.gotravspeed.com/profile.php?vid={village_id}")
+    driver.get(f"{GAME_URL}/profile.php?vid={village_id}")
     # Go to the Profile tab
     profile_tab_link = WebDriverWait(driver, 3).until(
         EC.element_to_be_clickable(
@@ -462,7 +474,7 @@ def rename_village(village_id, village_name):
 
 
 def get_village_ids(excluded_ids):
-    driver.get("https://fun.gotravspeed.com/village2.php")
+    driver.get(f"{GAME_URL}/village2.php")
     village_links = WebDriverWait(driver, 3).until(
         EC.presence_of_all_elements_located(
             (
@@ -480,7 +492,7 @@ def get_village_ids(excluded_ids):
 
 def switch_to_village(village_id):
     try:
-        driver.get(f"https://fun.gotravspeed.com/village2.php?vid={village_id}")
+        driver.get(f"{GAME_URL}/village2.php?vid={village_id}")
         logging.info(f"Switched to the village with ID {village_id}")
     except Exception as e:
         logging.error(f"Error switching to the village with ID {village_id}: {e}")
@@ -491,29 +503,14 @@ def switch_to_village(village_id):
 # ==============================================
 
 def start_celebration(times):
-    town_hall_id = 35  # Adjust this to the correct ID for your Town Hall
-    for _ in range(times):
-        try:
-            switch_to_village(8426)
-            # Navigate to the Town Hall
-            driver.get(f"https://fun.gotravspeed.com/build.php?id={town_hall_id}")
-            logging.info("Navigated to Town Hall")
-
-            # Start the Large Celebration
-            large_celebration_link = WebDriverWait(driver, 3).until(
-                EC.element_to_be_clickable((By.XPATH, "//a[contains(@href, 'a=2')]"))
-            )
-            large_celebration_link.click()
-            logging.info("Started Large Celebration")
-
-            # Wait for the celebration to be acknowledged before starting the next one
-            WebDriverWait(driver, 3).until(
-                EC.presence_of_element_located((By.XPATH, "//p[contains(text(), 'Updated Town Hall Fully')]"))
-            )
-
-        except Exception as e:
-            logging.error(f"Error during celebration: {e}")
-            # Handle the error appropriately (e.g., re-login, retry, etc.)
+    # Celebrations go through the pipelined httpx engine instead of clicking
+    # through the Town Hall once per celebration; it stops early once the
+    # culture points for the next village are reached. It reuses the
+    # browser's session rather than logging in again over httpx
+    try:
+        start_celebrations(times, villages=[8426], cookies=bridge.httpx_cookies())
+    except Exception as e:
+        logging.error(f"Error during celebration: {e}")
 
 
 
@@ -0,0 +1,121 @@
+import json
+import logging
+import os
+import re
+import time
+from config import settings
+from metrics import registry
+from tokens import is_fully_upgraded
+
+# Building levels per village, kept on disk between runs. Every build.php
+# page the plans load is recorded as (village, position) -> building id,
+# level, whether it is fully upgraded and when the page was read, so a plan
+# entry known to be done is skipped without a request. Only levels read from
+# a page are stored, never ones inferred from an upgrade request. Entries
+# older than the TTL are checked again, and a page showing less than the
+# cache replaces the cached entry.
+
+config = settings
+
+BUILDINGS_FILE = "buildings.json"
+
+# Seconds a cached level is trusted before the page is loaded again
+BUILDINGS_TTL = config.get("buildingsTtl", 24 * 3600)
+
+# Positions up to this one are resource fields; what they produce does not
+# depend on the plan's building id
+LAST_RESOURCE_FIELD = 18
+
+# <div id="build" class="gid15"> and "<span class="level">level 5</span>"
+GID = re.compile(rb'id="build"[^>]*class="gid(\d+)"', re.I)
+LEVEL = re.compile(rb'class="level"[^>]*>\s*level\s*(\d+)', re.I)
+
+
+def read_building(content):
+    """
+    Returns (building id, level, fully upgraded) from a build.php page; the
+    id and level are None when the page does not show them.
+    """
+    gid = GID.search(content)
+    level = LEVEL.search(content)
+    return (
+        int(gid.group(1)) if gid and gid.group(1) != b"0" else None,
+        int(level.group(1)) if level else None,
+        is_fully_upgraded(content)
+    )
+
+
+class BuildingCache:
+    def __init__(self, path=BUILDINGS_FILE, ttl=BUILDINGS_TTL):
+        self.path = path
+        self.ttl = ttl
+        # village id -> position -> [building id, level, fully upgraded, read at]
+        self.villages = self._load()
+        self.changed = False
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            logging.error(f"Ignoring unreadable building cache {self.path}: {e}")
+            return {}
+
+    def get(self, village_id, position_id):
+        return self.villages.get(str(village_id), {}).get(str(position_id))
+
+    def record(self, village_id, position_id, content):
+        """Records what a build.php page shows; returns read_building's result."""
+        building_id, level, full = read_building(content)
+        if building_id is None and level is None:
+            return building_id, level, full
+        cached = self.get(village_id, position_id)
+        if cached is not None and level is not None and cached[1] is not None and level < cached[1]:
+            registry.incr("buildings:cache:stale")
+            logging.warning(
+                f"Building cache had level {cached[1]} at position {position_id} in village "
+                f"{village_id}, the page shows {level}"
+            )
+        positions = self.villages.setdefault(str(village_id), {})
+        positions[str(position_id)] = [building_id, level, int(full), int(time.time())]
+        self.changed = True
+        return building_id, level, full
+
+    def is_done(self, village_id, entry):
+        """
+        True when plan `entry` ({pid, bid, loop}) is known to be finished,
+        from a page read within the TTL.
+        """
+        cached = self.get(village_id, entry["pid"])
+        # Entries without a read time come from before the TTL was kept
+        if cached is None or len(cached) < 4 or time.time() - cached[3] >= self.ttl:
+            return False
+        building_id, level, full, read_at = cached
+        if building_id is not None and building_id != entry["bid"] and entry["pid"] > LAST_RESOURCE_FIELD:
+            return False
+        done = bool(full) or (level is not None and level >= entry["loop"])
+        if done:
+            registry.incr("buildings:cache:skips")
+        return done
+
+    def forget(self, village_id, position_id=None):
+        positions = self.villages.get(str(village_id), {})
+        if position_id is None:
+            self.villages.pop(str(village_id), None)
+        else:
+            positions.pop(str(position_id), None)
+        self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+        try:
+            tmp_file = self.path + ".tmp"
+            with open(tmp_file, 'w') as file:
+                json.dump(self.villages, file, separators=(",", ":"))
+            os.replace(tmp_file, self.path)
+            self.changed = False
+        except OSError as e:
+            logging.error(f"Failed to save building cache: {e}")
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import math
+import re
+import time
+from config import settings, GAME_URL
+from limiter import limiter
+from metrics import registry, VERBOSE
+from session_manager import borrow_client, close_client
+from login import login
+from shop import open_gate
+from shop_pool import shard
+from streaming import fetch_until, until_build_link
+from tokens import extract_build_link
+
+# Pipelined large-celebration engine. Submitting a celebration (the town
+# hall's `a=2` link) answers with the town hall page again, which carries the
+# link for the next one, so every worker runs its own chain of celebrations
+# and `window` chains run side by side. Culture points are checked along the
+# way and the engine stops as soon as the next settlement threshold is met.
+
+config = settings
+
+TOWN_HALL_ID = 35
+RESIDENCE_ID = config.get("villages", {}).get("residenceID", "30")
+
+CELEBRATION_URL = f"{GAME_URL}/build.php?id={TOWN_HALL_ID}"
+CULTURE_URL = f"{GAME_URL}/build.php?id={RESIDENCE_ID}&t=1"
+
+# Celebration chains in flight
+CELEBRATION_WINDOW = config.get("celebrationWindow", 8)
+
+# Culture points one large celebration yields, 0 to measure it as we go
+CELEBRATION_CULTURE_POINTS = config.get("celebrationCulturePoints", 0)
+
+# Celebrations between two culture point checks. Unless the yield is
+# configured, a single celebration runs first to measure it
+CULTURE_CHECK_EVERY = 50
+
+# Consecutive failures of one chain after which the job gives up
+MAX_FAILURES = 10
+
+# "You currently have <b>N</b> culture points" and "requires <b>N</b> culture points"
+CURRENT_CULTURE = re.compile(rb'currently have\s*<b>(\d+)</b>')
+REQUIRED_CULTURE = re.compile(rb'requires\s*<b>(\d+)</b>')
+
+
+# Raised when the town hall offers no large celebration link
+class CelebrationError(Exception):
+    pass
+
+
+async def read_culture_points(client):
+    """
+    Returns (current, required) culture points from the residence page, or
+    None when the page does not show them.
+    """
+    async with limiter.acquire("/build.php") as slot:
+        response = slot.observe(await client.get(CULTURE_URL))
+    current = CURRENT_CULTURE.search(response.content)
+    required = REQUIRED_CULTURE.search(response.content)
+    if not current or not required:
+        return None
+    return int(current.group(1)), int(required.group(1))
+
+
+async def fetch_celebration_link(client, url):
+    async with limiter.acquire("/build.php") as slot:
+        response, data, found = await fetch_until(client, url, until_build_link())
+        slot.observe(response)
+        link = extract_build_link(data)
+        if link is None or "a=2" not in link:
+            slot.fail()
+            return None
+        return link
+
+
+async def run_celebrations(client, count, window=None, progress=None, gate=None):
+    """
+    Starts up to `count` large celebrations in the active village with up to
+    `window` in flight. Returns the number started and whether the culture
+    point threshold has been reached.
+    """
+    gate = gate or open_gate
+    window = max(1, window or CELEBRATION_WINDOW)
+    state = {"remaining": count, "completed": 0, "in_flight": 0, "next_check": CULTURE_CHECK_EVERY, "done": False}
+
+    culture = await read_culture_points(client)
+    if culture is None:
+        logging.warning("Culture points not found on the residence page, running all celebrations")
+    else:
+        current, required = culture
+        if current >= required:
+            logging.info(f"Culture points already at {current}/{required}, no celebrations needed")
+            return 0, True
+        if CELEBRATION_CULTURE_POINTS:
+            state["remaining"] = min(count, math.ceil((required - current) / CELEBRATION_CULTURE_POINTS))
+        else:
+            # Measure the yield of a single celebration before opening the window
+            state["remaining"] = min(count, 1)
+    checking = asyncio.Lock()
+
+    async def check_culture():
+        if checking.locked():
+            return
+        async with checking:
+            now = await read_culture_points(client)
+            if now is None:
+                return
+            # Counted after the read, so celebrations that landed during it
+            # lower the measured yield rather than inflate it
+            completed = state["completed"]
+            current, required = now
+            if current >= required:
+                logging.info(f"Culture points reached {current}/{required}")
+                state["done"] = True
+                return
+            # Only start as many more as the measured yield says are missing
+            per_celebration = CELEBRATION_CULTURE_POINTS or (current - culture[0]) / completed
+            left = count - completed - state["in_flight"]
+            if per_celebration > 0:
+                needed = math.ceil((required - current) / per_celebration) - state["in_flight"]
+                left = min(left, needed)
+            state["remaining"] = max(0, left)
+
+    async def worker():
+        link = None
+        failures = 0
+        while state["remaining"] > 0 and not state["done"]:
+            state["remaining"] -= 1
+            try:
+                async with gate("celebration"):
+                    if link is None:
+                        link = await fetch_celebration_link(client, CELEBRATION_URL)
+                        if link is None:
+                            raise CelebrationError("No large celebration link on the town hall page")
+                    state["in_flight"] += 1
+                    try:
+                        link = await fetch_celebration_link(client, f"{GAME_URL}/{link}")
+                    finally:
+                        state["in_flight"] -= 1
+            except CelebrationError:
+                raise
+            except Exception as e:
+                logging.error(f"Error during large celebration: {e}")
+                link = None
+
+            if link is None:
+                state["remaining"] += 1
+                failures += 1
+                if failures >= MAX_FAILURES:
+                    raise CelebrationError("Large celebrations keep failing")
+                continue
+
+            failures = 0
+            state["completed"] += 1
+            if progress is not None:
+                progress["completed"] += 1
+            registry.record_action("celebration")
+            if VERBOSE:
+                logging.info("Large Celebration Started")
+            if culture is not None and state["completed"] >= state["next_check"]:
+                state["next_check"] = state["completed"] + CULTURE_CHECK_EVERY
+                await check_culture()
+
+    while True:
+        tasks = [asyncio.ensure_future(worker()) for _ in range(min(window, max(state["remaining"], 1)))]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        if culture is None or state["done"] or state["completed"] >= count:
+            break
+        # The yield estimate ran out before the threshold: check and top up
+        await check_culture()
+        if state["done"] or not state["remaining"]:
+            break
+    return state["completed"], state["done"]
+
+
+async def celebrate(loop_count, cookies, progress=None, gate=None, villages=None, window=None):
+    """
+    Runs `loop_count` large celebrations, split across `villages` when given
+    (one village at a time, since switching villages changes the session's
+    active village). Stops early once the culture point threshold is met.
+    """
+    started = time.monotonic()
+    completed = 0
+    async with borrow_client(cookies) as client:
+        if not villages:
+            completed, done = await run_celebrations(client, loop_count, window=window, progress=progress, gate=gate)
+        else:
+            for village_id, count in zip(villages, shard(loop_count, len(villages))):
+                await client.get(f"{GAME_URL}/village2.php?vid={village_id}")
+                started_here, done = await run_celebrations(client, count, window=window, progress=progress, gate=gate)
+                completed += started_here
+                if done:
+                    break
+    elapsed = time.monotonic() - started
+    rate = completed / elapsed if elapsed else 0.0
+    logging.info(f"Started {completed} large celebrations in {elapsed:.1f}s ({rate:.1f}/s)")
+    return completed
+
+
+def start_celebrations(loop_count, villages=None, cookies=None):
+    """
+    Blocking entry point for the Selenium scripts: runs the celebrations on a
+    fresh event loop with the given cookies (the browser's session), logging
+    in over httpx only when none are passed.
+    """
+    async def run():
+        nonlocal cookies
+        if cookies is None:
+            cookies = await login()
+        try:
+            return await celebrate(loop_count, cookies, villages=villages)
+        finally:
+            await close_client()
+    return asyncio.run(run())
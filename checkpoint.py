@@ -0,0 +1,88 @@
+import asyncio
+import json
+import logging
+import os
+
+# Completed-unit counts per loop, written atomically to disk every
+# second, so a restarted run resumes each loop where it stopped instead of
+# repeating purchases, celebrations or builds that already went through.
+# Several processes share the file (main.py's shop loops, the construction
+# plans), so each one rewrites only the jobs it runs and keeps the rest of
+# what is on disk.
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+# Seconds between two writes while loops are running
+CHECKPOINT_INTERVAL = 1.0
+
+
+class CheckpointStore:
+    def __init__(self, path=CHECKPOINT_FILE):
+        self.path = path
+        self.jobs = self._load()
+        # Jobs this process runs or cleared; only these are written back
+        self.owned = set()
+        self.cleared = set()
+        self.saved = json.dumps(self.jobs, sort_keys=True)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            logging.error(f"Ignoring unreadable checkpoint file {self.path}: {e}")
+            return {}
+
+    def progress(self, job, total):
+        """
+        Returns the progress dict of `job`; loops count finished units in its
+        "completed" entry. A checkpoint saved for another total is clamped.
+        """
+        self.owned.add(job)
+        self.cleared.discard(job)
+        progress = self.jobs.setdefault(job, {"completed": 0, "total": total})
+        progress["total"] = total
+        progress["completed"] = min(progress["completed"], total)
+        if progress["completed"]:
+            logging.info(f"Resuming {job} from checkpoint at {progress['completed']}/{total}")
+        return progress
+
+    def completed(self, job):
+        return self.jobs.get(job, {}).get("completed", 0)
+
+    def clear(self, *jobs):
+        for job in jobs:
+            self.jobs.pop(job, None)
+            self.owned.discard(job)
+            self.cleared.add(job)
+        self.save()
+
+    def save(self):
+        data = json.dumps(self.jobs, sort_keys=True)
+        if data == self.saved:
+            return
+        # Merge into the file as it is now, so other processes' jobs survive
+        merged = self._load()
+        for job in self.cleared:
+            merged.pop(job, None)
+        for job in self.owned:
+            if job in self.jobs:
+                merged[job] = self.jobs[job]
+        try:
+            tmp_file = self.path + ".tmp"
+            with open(tmp_file, 'w') as file:
+                file.write(json.dumps(merged, sort_keys=True))
+            os.replace(tmp_file, self.path)
+            self.saved = data
+        except OSError as e:
+            logging.error(f"Failed to save checkpoint: {e}")
+
+    async def save_periodically(self, interval=CHECKPOINT_INTERVAL):
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                self.save()
+        finally:
+            self.save()
@@ -13,3 +13,25 @@ def write_config(config):
             print("Config updated successfully")
     except Exception as e:
         print(f"Error writing to config.json: {e}")
+
+def load_settings():
+    try:
+        with open('config.json', mode='r', encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+# config.json as read once at startup, shared by every module that only
+# reads its settings; scripts that change the file use read_config()
+settings = load_settings()
+
+# Base URLs of the lobby and the game server. Set loginUrl/gameUrl in
+# config.json (e.g. to the local mock server) to run every script against
+# another host.
+def read_urls():
+    return (
+        settings.get('loginUrl', 'https://gotravspeed.com').rstrip('/'),
+        settings.get('gameUrl', 'https://fun.gotravspeed.com').rstrip('/')
+    )
+
+LOGIN_URL, GAME_URL = read_urls()
@@ -0,0 +1,241 @@
+import asyncio
+import logging
+from bs4 import BeautifulSoup
+from config import settings, GAME_URL
+from session_manager import borrow_client, session_client, close_client
+from login import login, full_login
+from log_setup import setup_logging
+from tokens import extract_input_value
+from streaming import fetch_until, until_input, until_marker
+from forms import RENAME_FORM, SETTLER_FORM, FORM_HEADERS
+from plans import run_plan
+from checkpoint import CheckpointStore
+
+# Construction engine over the shared async client. It covers everything
+# building.py and building2.py drive Chrome for (village list, switching,
+# renaming, settling) and builds villages to the plans in plans.py. Villages
+# are built one after the other on the cached login session; building
+# several at once needs a game session per village and is opt-in. Plan
+# progress is checkpointed per village, so a restart resumes the plans.
+
+config = settings
+
+RESIDENCE_ID = config.get("villages", {}).get("residenceID", "30")
+SETTLER_ID = config.get("villages", {}).get("settlerID", "30")
+MAX_VILLAGES = config.get("maxVillages", 500)
+# Tile new villages are settled around, and villages main() leaves alone
+CAPITAL_VILLAGE_ID = config.get("capitalVillageId", 9625)
+EXCLUDED_VILLAGE_IDS = [str(village_id) for village_id in config.get("excludedVillageIds", [])]
+
+# Game sessions building villages side by side in construct_villages. Every
+# session past the first is a separate login on the same account, which the
+# live server may answer by ending the others, and against the mock several
+# sessions were slower than one; keep this at 1 unless measured otherwise
+CONSTRUCTION_SESSIONS = config.get("constructionSessions", 1)
+
+# Village tiles checked at once while looking for a free spot
+SCAN_BATCH = 16
+
+
+async def switch_to_village(client, village_id):
+    await client.get(f"{GAME_URL}/village2.php?vid={village_id}")
+    logging.info(f"Switched to the village with ID {village_id}")
+
+
+async def get_village_ids(client, excluded_ids=()):
+    """Returns the ids of the player's villages from the village list."""
+    response = await client.get(f"{GAME_URL}/village2.php")
+    soup = BeautifulSoup(response.text, 'html.parser')
+    village_ids = [
+        link['href'].split('=')[-1]
+        for link in soup.select("table#vlist td.link a[href*='vid=']")
+    ]
+    village_ids = [village_id for village_id in village_ids if village_id not in excluded_ids]
+    logging.info(f"Obtained {len(village_ids)} village IDs")
+    return village_ids
+
+
+async def rename_village(client, village_id, village_name):
+    await switch_to_village(client, village_id)
+    await client.get(f"{GAME_URL}/profile.php?t=1")
+    response = await client.post(
+        f"{GAME_URL}/profile.php",
+        headers=FORM_HEADERS,
+        content=RENAME_FORM.render(dname=village_name)
+    )
+    # The profile form answers with a redirect back to the profile
+    if response.is_success or response.is_redirect:
+        logging.info(f"Renamed village {village_id} to {village_name}")
+    else:
+        logging.error(f"Failed to rename village {village_id} to {village_name}")
+
+
+async def train_settlers(client):
+    response = await client.post(
+        f"{GAME_URL}/build.php?id={RESIDENCE_ID}",
+        headers=FORM_HEADERS,
+        content=f"tf%5B{SETTLER_ID}%5D=3&s1.x=50&s1.y=8"
+    )
+    if response.status_code == 200:
+        logging.info("Training 3 settlers")
+    else:
+        logging.error(f"Error during Settlers training: {response.status_code}")
+
+
+def generate_spiral_village_ids(center_id, start_radius=1, max_radius=25):
+    ids = []
+    for radius in range(start_radius, max_radius + 1):
+        for i in range(-radius, radius + 1):
+            ids.append(center_id - 401 * radius + i)
+        for i in range(-radius + 1, radius):
+            ids.append(center_id - 401 * i + radius)
+        for i in range(-radius, radius + 1):
+            ids.append(center_id + 401 * radius - i)
+        for i in range(-radius + 1, radius):
+            ids.append(center_id + 401 * i - radius)
+    return ids
+
+
+async def is_tile_empty(client, village_id):
+    response, page, found = await fetch_until(
+        client, f"{GAME_URL}/village3.php?id={village_id}", until_marker('building a new village')
+    )
+    return found
+
+
+async def find_empty_village_spot(client, center_id, start_radius=1, max_radius=25):
+    """
+    The first free tile in spiral order around `center_id`, checking
+    SCAN_BATCH tiles at a time, or None.
+    """
+    spiral_village_ids = generate_spiral_village_ids(center_id, start_radius, max_radius)
+    for start in range(0, len(spiral_village_ids), SCAN_BATCH):
+        batch = spiral_village_ids[start:start + SCAN_BATCH]
+        empty = await asyncio.gather(*(is_tile_empty(client, village_id) for village_id in batch))
+        for village_id, found in zip(batch, empty):
+            if found:
+                return village_id
+    return None
+
+
+async def settle_village(client, village_id):
+    response, page, found = await fetch_until(client, f"{GAME_URL}/v2v.php?id={village_id}", until_input('key'))
+    key = extract_input_value(page, 'key')
+    if key is None:
+        logging.error(f"Key not found for sending settlers to {village_id}")
+        return False
+    response = await client.post(
+        f"{GAME_URL}/v2v.php",
+        headers=FORM_HEADERS,
+        content=SETTLER_FORM.render(id=village_id, key=key)
+    )
+    if response.status_code != 200 or 'class="error"' in response.text:
+        logging.error(f"Failed to send settlers to new village at {village_id}")
+        return False
+    # Dismiss the new village popup
+    await client.get(f"{GAME_URL}/shownvill.php")
+    await client.get(f"{GAME_URL}/village1.php")
+    return True
+
+
+async def train_settlers_and_find_new_village(client, capital_village_id, start_radius=1, max_radius=25):
+    """
+    Trains settlers in the active village and settles the nearest free tile
+    around the capital. Returns the new village's tile id or None.
+    """
+    await train_settlers(client)
+    village_id = await find_empty_village_spot(client, capital_village_id, start_radius, max_radius)
+    if village_id is None:
+        logging.error(f"No free spot found around {capital_village_id}")
+        return None
+    if not await settle_village(client, village_id):
+        return None
+    logging.info(f"Settled a new village at ID {village_id}")
+    return village_id
+
+
+async def construct(cookies, village_id, village_type, building_config=None):
+    async with borrow_client(cookies) as client:
+        return await run_plan(client, village_id, village_type, building_config)
+
+
+async def construct_capital(cookies, village_id, building_config=None):
+    return await construct(cookies, village_id, "capital", building_config)
+
+
+async def construct_artefact(cookies, village_id, building_config=None):
+    return await construct(cookies, village_id, "artefact", building_config)
+
+
+async def construct_secondary(cookies, village_id, building_config=None):
+    return await construct(cookies, village_id, "secondary", building_config)
+
+
+async def construct_villages(villages, sessions=None, checkpoints=None):
+    """
+    Builds every `(village_id, village_type)` in `villages`, with up to
+    `sessions` villages under construction at once. The first session is
+    the cached login on the shared client; each extra one is a login of its
+    own, since the active village is per session. Each village resumes from
+    and saves to `checkpoints` (checkpoint.json by default). Returns the
+    PlanRun of every village that finished.
+    """
+    checkpoints = checkpoints or CheckpointStore()
+    runs = []
+    queue = asyncio.Queue()
+    for village in villages:
+        queue.put_nowait(village)
+
+    async def build(client):
+        while True:
+            try:
+                village_id, village_type = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                runs.append(await run_plan(client, village_id, village_type, checkpoints=checkpoints))
+            except Exception as e:
+                logging.error(f"Error constructing village {village_id}: {e}")
+
+    async def extra_session(cookies):
+        async with session_client(cookies) as client:
+            await build(client)
+
+    sessions = max(1, min(sessions or CONSTRUCTION_SESSIONS, len(villages)))
+    cookies = await login()
+    # Extra logins one at a time, never several at once on the same account
+    extra_cookies = []
+    for _ in range(sessions - 1):
+        extra_cookies.append(await full_login())
+    async with borrow_client(cookies) as client:
+        await asyncio.gather(build(client), *(extra_session(jar) for jar in extra_cookies))
+    return runs
+
+
+async def main():
+    """
+    building2.py's main flow: build the newest village as a secondary one,
+    then train settlers and settle the next, until MAX_VILLAGES.
+    """
+    cookies = await login()
+    # A restart picks the newest village's plan up from checkpoint.json
+    checkpoints = CheckpointStore()
+    try:
+        async with borrow_client(cookies) as client:
+            while True:
+                village_ids = await get_village_ids(client, EXCLUDED_VILLAGE_IDS)
+                if not village_ids:
+                    logging.error("No villages to build, check excludedVillageIds and the login")
+                    break
+                if len(village_ids) >= MAX_VILLAGES:
+                    break
+                await run_plan(client, village_ids[-1], "secondary", checkpoints=checkpoints)
+                if await train_settlers_and_find_new_village(client, CAPITAL_VILLAGE_ID) is None:
+                    break
+    finally:
+        await close_client()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+import logging
+import httpx
+from metrics import registry
+
+# Cookie bridge between the Selenium driver and the requests session used by
+# building.py and building2.py. The cookies are copied over once after login
+# instead of before every request, and again only when the server rotates a
+# cookie or a request comes back logged out; every copy is one WebDriver
+# round trip, which is what the counters track.
+
+
+def is_logged_out(response):
+    return 'name="password"' in response.text
+
+
+class CookieBridge:
+    def __init__(self, session):
+        self.session = session
+        self.driver = None
+        self.syncs = 0
+        self.requests = 0
+
+    def sync(self, driver=None):
+        """Copies the driver's cookies into the session, e.g. after login."""
+        if driver is not None:
+            self.driver = driver
+        for cookie in self.driver.get_cookies():
+            self.session.cookies.set(cookie["name"], cookie["value"])
+        self.syncs += 1
+        registry.incr("cookie_bridge:syncs")
+
+    def httpx_cookies(self):
+        """
+        The driver's cookies as an httpx jar, so the async engines reuse the
+        browser's game session instead of logging in again.
+        """
+        cookies = httpx.Cookies()
+        for cookie in self.driver.get_cookies():
+            cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain", ""), path=cookie.get("path", "/"))
+        return cookies
+
+    def _cookie_values(self):
+        return {cookie.name: cookie.value for cookie in self.session.cookies}
+
+    def _push_rotated(self, before):
+        # The session already stored the new values; hand the ones that
+        # changed to the browser too, so both keep using the same game
+        # session. Set-Cookie headers that repeat the current value are not
+        # a rotation and cost no WebDriver round trip.
+        rotated = {name: value for name, value in self._cookie_values().items()
+                   if before.get(name) != value}
+        if not rotated:
+            return
+        for name, value in rotated.items():
+            try:
+                self.driver.add_cookie({"name": name, "value": value})
+            except Exception as e:
+                logging.warning(f"Could not pass rotated cookie {name} to the browser: {e}")
+        self.syncs += 1
+        registry.incr("cookie_bridge:syncs")
+
+    def request(self, method, url, **kwargs):
+        """
+        session.request with the driver's cookies, syncing only before the
+        first request, after a rotation and on a logged-out response.
+        """
+        if not self.syncs:
+            self.sync()
+        before = self._cookie_values()
+        response = self.session.request(method, url, **kwargs)
+        self.requests += 1
+        registry.incr("cookie_bridge:requests")
+        if is_logged_out(response):
+            self.sync()
+            response = self.session.request(method, url, **kwargs)
+            self.requests += 1
+            registry.incr("cookie_bridge:requests")
+        elif response.cookies:
+            self._push_rotated(before)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    @property
+    def syncs_per_request(self):
+        return self.syncs / self.requests if self.requests else 0.0
+
+    def log_stats(self):
+        logging.info(
+            f"Cookie bridge: {self.syncs} syncs for {self.requests} requests "
+            f"({self.syncs_per_request:.3f} per request)"
+        )
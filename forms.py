@@ -0,0 +1,100 @@
+from urllib.parse import quote_plus
+
+# Pre-encoded form bodies for the POSTs sent in hot loops. The raid, settler,
+# shop and rename forms only change in one or two fields per request, so the
+# static fields are url-encoded to bytes once and the variable ones are
+# spliced in on each call, instead of building and encoding a dict every time.
+
+# Headers for a pre-encoded body posted with `content=`
+FORM_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+
+
+class FormTemplate:
+    """
+    An application/x-www-form-urlencoded body with fixed field order. Fields
+    given a value of None are variable and filled in by `render`; the result
+    is byte-for-byte what urlencode produces for the same fields.
+    """
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self._parts = []
+        self._slots = []
+        static = []
+        for name, value in self.fields:
+            if value is None:
+                static.append(f"{quote_plus(name)}=")
+                self._parts.append("&".join(static).encode("ascii"))
+                self._slots.append((len(self._parts), name))
+                self._parts.append(b"")
+                static = [""]
+            else:
+                static.append(f"{quote_plus(name)}={quote_plus(str(value))}")
+        self._parts.append("&".join(static).encode("ascii"))
+
+    @property
+    def variables(self):
+        return [name for _, name in self._slots]
+
+    def render(self, **values):
+        """Returns the encoded body with the variable fields set from `values`."""
+        parts = self._parts.copy()
+        for index, name in self._slots:
+            parts[index] = quote_plus(str(values[name])).encode("ascii")
+        return b"".join(parts)
+
+
+# Raid on the target village: Pathfinders and Haeduans
+RAID_FORM = FormTemplate([
+    ('id', None),
+    ('c', '4'),  # Attack: raid
+    ('t[1]', '0'),  # Phalanx
+    ('t[2]', '0'),  # Swordsman
+    ('t[3]', '20.0000000000000000000000e+22'),  # Pathfinder
+    ('t[4]', '0'),  # Theutates Thunder
+    ('t[5]', '0'),  # Druidrider
+    ('t[6]', '20.0000000000000000000000e+22'),  # Haeduan
+    ('t[7]', '0'),  # Battering Ram
+    ('t[8]', '0'),  # Trebuchet
+    ('t[9]', '0'),  # Chief
+    ('t[0]', '0'),  # Settler
+    ('key', None)
+])
+
+
+def settler_form(key_field='key'):
+    """Three settlers to a new village spot; the key input is `key_field`."""
+    return FormTemplate([
+        ('id', None),
+        ('c', '4'),
+        ('t[1]', '0'), ('t[2]', '0'), ('t[3]', '0'), ('t[4]', '0'), ('t[5]', '0'),
+        ('t[6]', '0'), ('t[7]', '0'), ('t[8]', '0'), ('t[9]', '0'), ('t[10]', '3'),
+        (key_field, None)
+    ])
+
+
+SETTLER_FORM = settler_form()
+
+# Shop purchase of the selected resource
+SHOP_FORM = FormTemplate([
+    ('selected_res', '4'),
+    ('g-recaptcha-response', 'xxxx'),
+    ('xor', '100'),
+    ('key', None)
+])
+
+# Profile form renaming the active village to `dname`
+RENAME_FORM = FormTemplate([
+    ('e', '1'),
+    ('oldavatar', ''),
+    ('jahr', ''),
+    ('monat', '0'),
+    ('tag', ''),
+    ('be1', ''),
+    ('mw', '0'),
+    ('ort', ''),
+    ('dname', None),
+    ('be2', ''),
+    ('s1.x', '26'),
+    ('s1.y', '16')
+])
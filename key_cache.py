@@ -0,0 +1,108 @@
+import time
+from collections import OrderedDict
+from metrics import registry
+
+# Reuse cache for shop keys. Fetching a fresh key before every purchase
+# doubles the request count; when the server accepts a key for several
+# purchases or for a while, the cache hands the same key out again until one
+# of its invalidation rules says it is spent or a purchase gets rejected.
+
+
+# A key handed out `uses` times since it was fetched at `fetched`
+class KeyEntry:
+    def __init__(self, key):
+        self.key = key
+        self.fetched = time.monotonic()
+        self.uses = 1
+
+
+# Invalidation rules: a key is spent as soon as any rule reports it expired
+
+class MaxUses:
+    def __init__(self, uses):
+        self.uses = uses
+
+    def expired(self, entry, now):
+        return bool(self.uses) and entry.uses >= self.uses
+
+    def __repr__(self):
+        return f"MaxUses({self.uses})"
+
+
+class MaxAge:
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def expired(self, entry, now):
+        return bool(self.seconds) and now - entry.fetched >= self.seconds
+
+    def __repr__(self):
+        return f"MaxAge({self.seconds})"
+
+
+def rules_from_config(config):
+    """
+    Builds the rules from "shopKeyRules" in config.json. maxUses 1 (the
+    default) fetches a key per purchase; maxUses 0 reuses a key until the
+    server rejects it.
+    """
+    settings = config.get("shopKeyRules", {})
+    return [MaxUses(settings.get("maxUses", 1)), MaxAge(settings.get("maxAge", 0))]
+
+
+class KeyCache:
+    # Keys remembered after they left the cache, to tell a spent key from a
+    # fresh one when a late rejection comes in
+    RECENT_KEYS = 64
+
+    def __init__(self, fetch, rules, name="shop"):
+        self.fetch = fetch
+        self.rules = rules
+        self.name = name
+        self.entry = None
+        self.recent = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _expired(self, entry):
+        now = time.monotonic()
+        return any(rule.expired(entry, now) for rule in self.rules)
+
+    async def get(self):
+        """Returns a usable key, or None when the shop page had none."""
+        entry = self.entry
+        if entry is not None and not self._expired(entry):
+            entry.uses += 1
+            self.hits += 1
+            registry.incr(f"keys:{self.name}:hits")
+            return entry.key
+
+        self.misses += 1
+        registry.incr(f"keys:{self.name}:misses")
+        key = await self.fetch()
+        if key is None:
+            return None
+        entry = KeyEntry(key)
+        self.entry = entry
+        self.recent[key] = entry
+        while len(self.recent) > self.RECENT_KEYS:
+            self.recent.popitem(last=False)
+        return key
+
+    def reject(self, key):
+        """
+        Drops a key the server refused. Returns True when the key had been
+        reused, i.e. it simply ran out, rather than failing on first use.
+        """
+        if self.entry is not None and self.entry.key == key:
+            self.entry = None
+        entry = self.recent.get(key)
+        reused = entry is not None and entry.uses > 1
+        if reused:
+            registry.incr(f"keys:{self.name}:spent")
+        return reused
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import time
+import httpx
+from contextlib import asynccontextmanager
+from config import settings
+
+# Adaptive concurrency limiter shared by every request loop. Windows grow
+# additively while requests succeed quickly and shrink multiplicatively on
+# 5xx responses, timeouts, missing keys or slow responses (AIMD), so each loop
+# settles near the highest rate the server tolerates.
+
+config = settings
+
+INITIAL_WINDOW = config.get("initialWindow", 4)
+MIN_WINDOW = 1
+MAX_WINDOW = config.get("maxWindow", 64)
+
+# Window growth per fully successful window, and the factor applied on failure
+INCREASE = 1.0
+DECREASE = 0.5
+
+# Responses slower than this count as congestion
+LATENCY_TARGET = config.get("latencyTarget", 2.0)
+
+# Minimum time between two decreases of the same window, so a burst of
+# failures from one congested round trip only halves it once
+DECREASE_INTERVAL = 0.5
+
+
+class Window:
+    def __init__(self, size):
+        self.size = float(size)
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.successes = 0
+        self.failures = 0
+
+    @property
+    def limit(self):
+        return max(MIN_WINDOW, int(self.size))
+
+    def on_success(self):
+        self.successes += 1
+        self.size = min(MAX_WINDOW, self.size + INCREASE / max(self.size, 1.0))
+
+    def on_failure(self):
+        self.failures += 1
+        now = time.monotonic()
+        if now - self.last_decrease >= DECREASE_INTERVAL:
+            self.size = max(MIN_WINDOW, self.size * DECREASE)
+            self.last_decrease = now
+
+
+class Slot:
+    def __init__(self):
+        self.failed = False
+
+    def fail(self):
+        """Marks the request as failed (e.g. the page had no key)."""
+        self.failed = True
+
+    def observe(self, response):
+        """Marks the request as failed when the server answered with a 5xx."""
+        if response.status_code >= 500:
+            self.failed = True
+        return response
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial=INITIAL_WINDOW):
+        self.initial = initial
+        self.total = Window(initial)
+        self.endpoints = {}
+        self.condition = None
+        self.loop = None
+
+    def _endpoint(self, endpoint):
+        if endpoint not in self.endpoints:
+            self.endpoints[endpoint] = Window(self.initial)
+        return self.endpoints[endpoint]
+
+    @property
+    def window(self):
+        return self.total.limit
+
+    def limits(self):
+        return {endpoint: window.limit for endpoint, window in self.endpoints.items()}
+
+    @asynccontextmanager
+    async def acquire(self, endpoint):
+        """
+        Waits for a free slot in both the global and the endpoint window and
+        yields a Slot. Latency and outcome are recorded when the block exits.
+        """
+        window = self._endpoint(endpoint)
+        # The shared limiter may outlive an event loop (asyncio.run per script
+        # or benchmark scenario), so the condition is bound to the running one
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.condition = asyncio.Condition()
+            self.loop = loop
+            self.total.in_flight = 0
+            for other in self.endpoints.values():
+                other.in_flight = 0
+        async with self.condition:
+            await self.condition.wait_for(
+                lambda: self.total.in_flight < self.total.limit and window.in_flight < window.limit
+            )
+            self.total.in_flight += 1
+            window.in_flight += 1
+
+        slot = Slot()
+        started = time.monotonic()
+        try:
+            yield slot
+        except (httpx.TimeoutException, httpx.TransportError):
+            slot.failed = True
+            raise
+        finally:
+            latency = time.monotonic() - started
+            if slot.failed or latency > LATENCY_TARGET:
+                window.on_failure()
+                self.total.on_failure()
+            else:
+                window.on_success()
+                self.total.on_success()
+            async with self.condition:
+                self.total.in_flight -= 1
+                window.in_flight -= 1
+                self.condition.notify_all()
+
+    def log_limits(self):
+        limits = ", ".join(f"{endpoint}={limit}" for endpoint, limit in sorted(self.limits().items()))
+        logging.info(f"Concurrency window {self.window} ({limits})")
+
+
+# Shared limiter used by all request loops
+limiter = AdaptiveLimiter()
@@ -0,0 +1,112 @@
+import atexit
+import logging
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, RotatingFileHandler
+from config import settings
+
+# Queue-backed logging shared by the async modules. Log calls on the event
+# loop only put the record on an in-memory queue; one background thread
+# formats and writes records in batches, flushing once per batch, to a
+# size-rotated app.log and the console.
+
+config = settings
+
+LOG_FILE = config.get("logFile", "app.log")
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# app.log rotates at this size, keeping LOG_BACKUPS old files
+LOG_MAX_BYTES = config.get("logMaxBytes", 5 * 1024 * 1024)
+LOG_BACKUPS = config.get("logBackups", 3)
+
+# Most records written between two flushes
+BATCH_SIZE = 500
+
+_writer = None
+
+
+# Stream handlers flush after every record; these only flush when the writer
+# has finished a batch
+class _BatchFlush:
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+
+class BatchFileHandler(_BatchFlush, RotatingFileHandler):
+    pass
+
+
+class BatchStreamHandler(_BatchFlush, logging.StreamHandler):
+    pass
+
+
+class LogWriter(threading.Thread):
+    def __init__(self, records, handlers):
+        super().__init__(name="log-writer", daemon=True)
+        self.records = records
+        self.handlers = handlers
+        self.written = 0
+        self.batches = 0
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            batch = [self.records.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is None:
+                    stopping = True
+                    continue
+                for handler in self.handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+            for handler in self.handlers:
+                handler.flush_batch()
+            self.written += len(batch)
+            self.batches += 1
+
+    def stop(self):
+        self.records.put(None)
+        self.join(timeout=5.0)
+        for handler in self.handlers:
+            handler.flush_batch()
+            handler.close()
+
+
+def setup_logging(level=logging.INFO, log_file=LOG_FILE, console=True):
+    """
+    Routes the root logger through the background writer. Safe to call from
+    every module; only the first call installs the handlers.
+    """
+    global _writer
+    if _writer is not None:
+        return _writer
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+    if log_file:
+        handlers.append(BatchFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS))
+    if console:
+        handlers.append(BatchStreamHandler(sys.stderr))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(records))
+    root.setLevel(level)
+
+    _writer = LogWriter(records, handlers)
+    _writer.start()
+    atexit.register(_writer.stop)
+    return _writer
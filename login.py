@@ -1,13 +1,17 @@
 import asyncio
+import json
+import os
+import time
 import httpx
 from bs4 import BeautifulSoup
-from config import read_config
+from config import settings, GAME_URL, LOGIN_URL
+from session_manager import get_client
 
-# Read configuration from config.csv
-config = read_config()
+# Settings from config.json
+config = settings
 
 # Base URL for the website
-base_url = "https://gotravspeed.com"
+base_url = LOGIN_URL
 
 # Headers to mimic a real browser
 headers = {
@@ -22,7 +26,77 @@ headers = {
     'Upgrade-Insecure-Requests': '1'
 }
 
-async def login():
+# Saved cookie jar so restarts can skip the full login handshake
+SESSION_FILE = "session.json"
+
+# Lifetime assumed for a saved session whose cookies carry no expiry
+SESSION_TTL = 6 * 3600
+
+# Save the cookie jar to disk together with its expiry time
+def save_session(cookies):
+    saved = []
+    expiries = []
+    for cookie in cookies.jar:
+        saved.append({
+            'name': cookie.name,
+            'value': cookie.value,
+            'domain': cookie.domain,
+            'path': cookie.path
+        })
+        if cookie.expires:
+            expiries.append(cookie.expires)
+    expires = min(expiries) if expiries else time.time() + SESSION_TTL
+    try:
+        tmp_file = SESSION_FILE + ".tmp"
+        with open(tmp_file, 'w') as file:
+            json.dump({'expires': expires, 'cookies': saved}, file)
+        os.replace(tmp_file, SESSION_FILE)
+    except OSError as e:
+        print(f"Failed to save session: {e}")
+
+# Load the saved cookie jar, or None if there is none or it has expired
+def load_session():
+    try:
+        with open(SESSION_FILE, 'r') as file:
+            data = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+    if data.get('expires', 0) <= time.time():
+        return None
+    cookies = httpx.Cookies()
+    for cookie in data['cookies']:
+        cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'], path=cookie['path'])
+    return cookies
+
+def clear_session():
+    try:
+        os.remove(SESSION_FILE)
+    except FileNotFoundError:
+        pass
+
+# Check a session with one request: a live session gets the game page,
+# a dead one is redirected back to the login page
+async def validate_session(cookies):
+    client = get_client(cookies)
+    try:
+        response = await client.get(f"{GAME_URL}/village1.php", headers=headers)
+    except httpx.HTTPError:
+        return False
+    return response.status_code == 200 and 'name="password"' not in response.text
+
+async def login(force=False):
+    if not force:
+        cookies = load_session()
+        if cookies is not None and await validate_session(cookies):
+            print("Reusing saved session")
+            return cookies
+        clear_session()
+
+    cookies = await full_login()
+    save_session(cookies)
+    return cookies
+
+async def full_login():
     async with httpx.AsyncClient() as client:
         # Clear any existing cookies
         client.cookies.clear()
@@ -76,7 +150,7 @@ async def login():
             exit()
 
         # Step 6: Access a specific page in the game (e.g., village1.php)
-        response = await client.get("https://fun.gotravspeed.com/village1.php", headers=headers)
+        response = await client.get(f"{GAME_URL}/village1.php", headers=headers)
         if response.status_code != 200:
             print(f"Failed to access the game page")
             exit()
@@ -1,22 +1,38 @@
 import asyncio
-import subprocess
-import sys
-from resource import increase_production_async, increase_storage_async
-from login import login
+import logging
+from resource import increase_production_async, increase_storage_async, start_large_celebration
+from scheduler import ShopScheduler
+from checkpoint import CheckpointStore
+from supervisor import Supervisor
+from metrics import registry, start_dumping
+
+STORAGE_LOOPS = 2500
+PRODUCTION_LOOPS = 50000
+
+# Large celebrations to run alongside the shop loops, 0 to skip them
+CELEBRATION_LOOPS = 0
 
 async def main():
-    while True:
-        try:
-            cookies = await login()
+    supervisor = Supervisor()
+    checkpoints = CheckpointStore()
+    start_dumping()
 
-            # Perform your tasks
-            await increase_storage_async(2500, cookies)
-            await increase_production_async(50000, cookies)
+    while True:
+        # Storage, production and celebrations run side by side and share one
+        # concurrency budget; a failed job is restarted on its own and a
+        # restarted run resumes each job from checkpoint.json
+        scheduler = ShopScheduler(supervisor, checkpoints=checkpoints)
+        scheduler.add("storage", STORAGE_LOOPS, increase_storage_async)
+        scheduler.add("production", PRODUCTION_LOOPS, increase_production_async)
+        if CELEBRATION_LOOPS:
+            scheduler.add("celebration", CELEBRATION_LOOPS, start_large_celebration)
 
-        except Exception as e:
-            print(f"An error occurred: {e}. Restarting script.")
-            subprocess.Popen([sys.executable, 'main.py'])  # Start a new instance of the script
-            sys.exit(1)  # Exit the current script
+        # Perform your tasks
+        await scheduler.run()
+        if supervisor.stats:
+            logging.info(f"Supervisor summary:\n{supervisor.summary()}")
+        registry.dump()
+        logging.info(f"Metrics:\n{registry.format()}")
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from config import settings
+
+# In-process metrics registry: counters, rolling rates and latency histograms
+# keyed by endpoint and by action type. It replaces per-iteration INFO logs as
+# the throughput signal; the registry is dumped periodically to a compact JSON
+# file and can be printed on demand with `python metrics.py`.
+
+config = settings
+
+METRICS_FILE = "metrics.json"
+DUMP_INTERVAL = 30.0
+
+# Per-request/per-purchase log lines are off unless enabled in config.json
+VERBOSE = config.get("verboseLogging", False)
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+# Rolling rates keep one bucket per second for the last hour
+RATE_WINDOW = 3600
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, milliseconds):
+        for index, bound in enumerate(BUCKETS):
+            if milliseconds <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.total += milliseconds
+        self.max = max(self.max, milliseconds)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given percentile."""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(BUCKETS[index], self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 2) if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "max": round(self.max, 2),
+            "buckets": self.counts
+        }
+
+
+class Rate:
+    def __init__(self):
+        self.seconds = deque()
+
+    def mark(self, count=1, now=None):
+        second = int(now if now is not None else time.time())
+        if self.seconds and self.seconds[-1][0] == second:
+            self.seconds[-1][1] += count
+        else:
+            self.seconds.append([second, count])
+        while self.seconds and self.seconds[0][0] <= second - RATE_WINDOW:
+            self.seconds.popleft()
+
+    def total(self, window, now=None):
+        since = int(now if now is not None else time.time()) - window
+        return sum(count for second, count in self.seconds if second > since)
+
+    def per_second(self, window=10):
+        return self.total(window) / window
+
+    def snapshot(self):
+        return {
+            "per_second": round(self.per_second(), 3),
+            "per_minute": self.total(60),
+            "last_hour": self.total(3600)
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.started = time.time()
+        self.counters = {}
+        self.histograms = {}
+        self.rates = {}
+
+    def incr(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        if name not in self.histograms:
+            self.histograms[name] = Histogram()
+        self.histograms[name].observe(seconds * 1000)
+
+    def mark(self, name, count=1):
+        if name not in self.rates:
+            self.rates[name] = Rate()
+        self.rates[name].mark(count)
+
+    def record_request(self, endpoint, seconds, status):
+        self.incr(f"endpoint:{endpoint}:requests")
+        if status >= 500:
+            self.incr(f"endpoint:{endpoint}:errors")
+        self.observe(f"endpoint:{endpoint}", seconds)
+        self.mark(f"endpoint:{endpoint}")
+
+    def record_action(self, action, seconds=None, count=1):
+        self.incr(f"action:{action}", count)
+        self.mark(f"action:{action}", count)
+        if seconds is not None:
+            self.observe(f"action:{action}", seconds)
+
+    def action_rate(self, action):
+        rate = self.rates.get(f"action:{action}")
+        return rate.snapshot() if rate else Rate().snapshot()
+
+    def snapshot(self):
+        return {
+            "time": round(time.time(), 3),
+            "uptime": round(time.time() - self.started, 1),
+            "counters": dict(self.counters),
+            "rates": {name: rate.snapshot() for name, rate in self.rates.items()},
+            "latency_ms": {name: histogram.snapshot() for name, histogram in self.histograms.items()}
+        }
+
+    def dump(self, path=METRICS_FILE):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.snapshot(), file, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def format(self):
+        return format_snapshot(self.snapshot())
+
+
+def format_snapshot(snapshot):
+    lines = [f"uptime {snapshot['uptime']}s"]
+    for name, count in sorted(snapshot["counters"].items()):
+        rate = snapshot["rates"].get(name.rsplit(":", 1)[0] if name.endswith((":requests", ":errors")) else name)
+        rate_text = f"  {rate['per_second']}/s {rate['per_minute']}/min" if rate and not name.endswith(":errors") else ""
+        lines.append(f"{name:<40}{count:>10}{rate_text}")
+        if name.endswith(":hits"):
+            lookups = count + snapshot["counters"].get(name[:-len("hits")] + "misses", 0)
+            lines.append(f"{name[:-len('hits')] + 'hit_rate':<40}{count / lookups:>10.1%}")
+    for name, histogram in sorted(snapshot["latency_ms"].items()):
+        lines.append(
+            f"{name:<40}p50 {histogram['p50']}ms  p99 {histogram['p99']}ms  "
+            f"max {histogram['max']}ms  n={histogram['count']}"
+        )
+    return "\n".join(lines)
+
+
+# Shared registry
+registry = MetricsRegistry()
+
+
+async def dump_periodically(interval=DUMP_INTERVAL, path=METRICS_FILE):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            registry.dump(path)
+        except OSError as e:
+            logging.error(f"Failed to write metrics: {e}")
+
+
+def start_dumping(interval=DUMP_INTERVAL, path=METRICS_FILE):
+    """
+    Starts the periodic dump on the running event loop and returns the task.
+    """
+    return asyncio.ensure_future(dump_periodically(interval, path))
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else METRICS_FILE
+    with open(path) as file:
+        print(format_snapshot(json.load(file)))
@@ -0,0 +1,530 @@
+import argparse
+import json
+import logging
+import random
+import re
+import secrets
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# Local stand-in for gotravspeed.com, for offline load and throughput testing.
+# It serves both the lobby (login and /game/servers) and the game pages the
+# scripts use, backed by in-memory game state. Point loginUrl and gameUrl in
+# config.json at it to run any script unchanged:
+#
+#   python mock_server.py --port 8080 --latency 0.02 --error-rate 0.01
+#   "loginUrl": "http://127.0.0.1:8080", "gameUrl": "http://127.0.0.1:8080"
+#
+# GET /_stats returns the per-endpoint counters, POST /_reset clears them.
+
+SESSION_COOKIE = "PHPSESSID"
+MAX_LEVEL = 20
+WORLD_WONDER_ID = 40
+WORLD_WONDER_MAX_LEVEL = 100
+
+BUILDING_NAMES = {
+    1: "Woodcutter", 2: "Clay Pit", 3: "Iron Mine", 4: "Cropland",
+    5: "Sawmill", 6: "Brickworks", 7: "Iron Foundry", 11: "Granary",
+    12: "Smithy", 13: "Armory", 14: "Tournament Square", 15: "Main Building",
+    16: "Rally Point", 17: "Marketplace", 18: "Embassy", 19: "Barracks",
+    20: "Stable", 21: "Siege Workshop", 22: "Academy", 24: "Town Hall",
+    25: "Residence", 27: "Treasury", 33: "City Wall", 37: "Hero's Mansion",
+    40: "World Wonder", 44: "Christmas Tree"
+}
+
+# Culture points granted by one large celebration
+CELEBRATION_CULTURE_POINTS = 2000
+
+
+class GameState:
+    def __init__(self, username="scar", password="satkabir", capital_id=9625, occupied_ratio=0.6,
+                 key_uses=1, key_ttl=0.0, villages=1, required_culture_points=10000,
+                 training_queue=0, training_resources=0, upgrade_page=False, build_reject_rate=0.0):
+        self.lock = threading.Lock()
+        self.username = username
+        self.password = password
+        self.key_uses = key_uses
+        self.key_ttl = key_ttl
+        # Session id -> the village that session has active
+        self.sessions = {}
+        self.capital_id = capital_id
+        self.keys = {}
+        self.build_tokens = set()
+        # The player's own villages, which are also the raid targets
+        self.villages = [{"id": capital_id + i, "name": f"{i:04}"} for i in range(villages)]
+        self.buildings = {}
+        # Building levels gained across all villages
+        self.levels = 0
+        self.occupied = set()
+        self.occupied_ratio = occupied_ratio
+        self.pending_popup = False
+        self.purchases = {"production": 0, "storage": 0}
+        self.raids = 0
+        self.troops_trained = 0
+        # Trainings accepted before the queue is full / the resources run out, 0 for no limit
+        self.training_queue = training_queue
+        self.training_resources = training_resources
+        # Answer build and upgrade requests with the building's page, which
+        # carries the next upgrade token, instead of the village center
+        self.upgrade_page = upgrade_page
+        # Fraction of build and upgrade orders refused with a 200 page, the
+        # way the game answers a full build queue or missing resources
+        self.build_reject_rate = build_reject_rate
+        self.settlers = 0
+        self.celebrations = 0
+        self.culture_points = 0
+        self.required_culture_points = required_culture_points
+
+    # Tiles are occupied pseudo-randomly but stably, so repeated scans agree
+    def is_tile_empty(self, village_id):
+        if village_id in self.occupied or any(v["id"] == village_id for v in self.villages):
+            return False
+        return random.Random(village_id).random() >= self.occupied_ratio
+
+    def issue_key(self):
+        key = secrets.token_hex(6)
+        self.keys[key] = [self.key_uses, time.monotonic()]
+        return key
+
+    def use_key(self, key):
+        entry = self.keys.get(key)
+        if entry is None:
+            return False
+        uses, issued = entry
+        if self.key_ttl and time.monotonic() - issued > self.key_ttl:
+            del self.keys[key]
+            return False
+        if uses <= 1:
+            del self.keys[key]
+        else:
+            entry[0] -= 1
+        return True
+
+    def issue_build_token(self):
+        token = secrets.token_hex(3)
+        self.build_tokens.add(token)
+        return token
+
+    # Resource fields 1-18 exist from the start at level 0, the village
+    # center positions are empty until something is built there
+    def building(self, village_id, position):
+        bid = (position - 1) % 4 + 1 if 1 <= position <= 18 else None
+        return self.buildings.setdefault((village_id, position), {"bid": bid, "level": 0})
+
+    def max_level(self, bid):
+        return WORLD_WONDER_MAX_LEVEL if bid == WORLD_WONDER_ID else MAX_LEVEL
+
+
+def page(title, body, padding=0):
+    filler = ""
+    if padding:
+        filler = "<div id=\"footer\">" + ("<p>Travian speed server. </p>" * (padding // 30)) + "</div>"
+    return (
+        "<!DOCTYPE html>\n<html><head><meta charset=\"UTF-8\">"
+        f"<title>Travian {title}</title></head><body><div id=\"content\">{body}</div>{filler}</body></html>"
+    )
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockTravian/1.0"
+    # Headers and body are written separately; without this every response
+    # waits out a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        logging.debug("mock: " + format, *args)
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def handle_request(self, method):
+        parts = urlsplit(self.path)
+        self.endpoint = parts.path or "/"
+        self.query = {k: v[-1] for k, v in parse_qs(parts.query, keep_blank_values=True).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8", errors="replace") if length else ""
+        self.form = {k: v[-1] for k, v in parse_qs(body, keep_blank_values=True).items()}
+        self.set_cookie = None
+        self.session = None
+
+        if self.endpoint in ("/_stats", "/_reset"):
+            return self.handle_control(method)
+
+        self.server.count(self.endpoint, "requests")
+        if self.server.latency or self.server.jitter:
+            time.sleep(self.server.latency + random.uniform(0, self.server.jitter))
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self.server.count(self.endpoint, "errors")
+            return self.respond(500, page("Error", "<h1>Internal Server Error</h1>"))
+
+        handler = ROUTES.get(self.endpoint)
+        if handler is None:
+            return self.respond(404, page("Not found", "<h1>Not found</h1>"))
+        if self.endpoint not in PUBLIC_ROUTES and not self.logged_in():
+            return self.redirect(self.server.login_path)
+        with self.state.lock:
+            return handler(self, method)
+
+    def handle_control(self, method):
+        if self.endpoint == "/_reset" and method == "POST":
+            self.server.reset_counters()
+            return self.respond(200, "{}", "application/json")
+        return self.respond(200, json.dumps(self.server.snapshot()), "application/json")
+
+    def logged_in(self):
+        cookies = self.headers.get("Cookie", "")
+        match = re.search(SESSION_COOKIE + r"=([0-9a-f]+)", cookies)
+        self.session = match.group(1) if match else None
+        return self.session in self.state.sessions
+
+    # The active village is per session, as on the real server
+    @property
+    def current_village(self):
+        return self.state.sessions.get(self.session, self.state.capital_id)
+
+    @current_village.setter
+    def current_village(self, village_id):
+        self.state.sessions[self.session] = village_id
+
+    def respond(self, status, text, content_type="text/html; charset=UTF-8", headers=None):
+        data = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        if self.set_cookie:
+            self.send_header("Set-Cookie", self.set_cookie)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def redirect(self, location):
+        self.respond(302, "", headers={"Location": location})
+
+    def render(self, title, body):
+        self.respond(200, page(title, body, self.server.padding))
+
+    # Lobby
+
+    def lobby(self, method):
+        if method == "POST":
+            if self.form.get("name") != self.state.username or self.form.get("password") != self.state.password:
+                return self.render("Login", "<p class=\"error\">Login failed</p>")
+            session = secrets.token_hex(16)
+            self.state.sessions[session] = self.state.capital_id
+            self.set_cookie = f"{SESSION_COOKIE}={session}; Path=/"
+        return self.render(
+            "Login",
+            "<form method=\"post\"><input name=\"name\"><input name=\"password\" type=\"password\"></form>"
+        )
+
+    def servers(self, method):
+        if not self.logged_in():
+            return self.redirect("/")
+        return self.render("Servers", "<div class=\"server\"><h2><font>Fun</font></h2>"
+                                      "<button class=\"default__button-o-login\">Login</button></div>")
+
+    # Village overview pages
+
+    def village1(self, method):
+        if "vid" in self.query:
+            self.current_village = int(self.query["vid"])
+        if self.state.pending_popup and "id" in self.query:
+            return self.redirect("shownvill.php")
+        fields = "".join(
+            f"<area href=\"build.php?id={position}\" title=\"level {self.state.building(self.current_village, position)['level']}\">"
+            for position in range(1, 19)
+        )
+        return self.render("Village overview", f"<map id=\"rx\">{fields}</map>")
+
+    def village2(self, method):
+        state = self.state
+        if "vid" in self.query:
+            self.current_village = int(self.query["vid"])
+        if "id" in self.query and "k" in self.query:
+            if self.query["k"] not in state.build_tokens:
+                return self.render("Village center", "<p class=\"error\">Invalid token</p>")
+            state.build_tokens.discard(self.query["k"])
+            building = state.building(self.current_village, int(self.query["id"]))
+            if state.build_reject_rate and random.random() < state.build_reject_rate:
+                return self.render("Village center", "<p class=\"error\">Not enough resources</p>")
+            if "b" in self.query and building["bid"] is None:
+                building["bid"] = int(self.query["b"])
+                building["level"] = 1
+                state.levels += 1
+            elif building["bid"] is not None and building["level"] < state.max_level(building["bid"]):
+                building["level"] += 1
+                state.levels += 1
+            if state.upgrade_page:
+                return self.build("GET")
+        rows = "".join(
+            f"<tr><td class=\"link\"><a href=\"village2.php?vid={v['id']}\">{v['name']}</a></td></tr>"
+            for v in state.villages
+        )
+        return self.render("Village center", f"<map id=\"map2\"></map><table id=\"vlist\">{rows}</table>")
+
+    def village3(self, method):
+        village_id = int(self.query.get("id", 0))
+        if self.state.is_tile_empty(village_id):
+            body = f"<a href=\"v2v.php?id={village_id}\">»building a new village</a>"
+        else:
+            body = f"<h1>Village {village_id}</h1><p>Occupied</p>"
+        return self.render("Map detail", body)
+
+    def map(self, method):
+        return self.render("Map", "<div id=\"map\"></div>")
+
+    def shownvill(self, method):
+        self.state.pending_popup = False
+        return self.render("New village", "<p>New village founded!</p><a href=\"village1.php\">» continue</a>")
+
+    # Buildings
+
+    def build(self, method):
+        state = self.state
+        position = int(self.query.get("id", 0))
+        if method == "POST":
+            return self.train(position)
+        if position == 35 and self.query.get("a") == "2":
+            if self.query.get("k") in state.build_tokens:
+                state.build_tokens.discard(self.query["k"])
+                state.celebrations += 1
+                state.culture_points += CELEBRATION_CULTURE_POINTS
+        if position == 30 and self.query.get("t") == "1":
+            return self.render("Residence", (
+                f"<p>You currently have <b>{state.culture_points}</b> culture points.</p>"
+                f"<p>The establishment of a new village or occupation requires "
+                f"<b>{state.required_culture_points}</b> culture points.</p>"
+            ))
+
+        building = state.building(self.current_village, position)
+        token = state.issue_build_token()
+        if position == 35 and building["bid"] is None:
+            building.update(bid=24, level=MAX_LEVEL)
+        if building["bid"] is None:
+            links = "".join(
+                f"<a class=\"build\" href=\"village2.php?id={position}&amp;b={bid}&amp;k={token}\">Construct {name}</a>"
+                for bid, name in BUILDING_NAMES.items() if bid > 4
+            )
+            return self.render("Construct", f"<div id=\"build\" class=\"gid0\"><h1>Construct new building</h1>{links}</div>")
+
+        name = BUILDING_NAMES.get(building["bid"], "Building")
+        level = building["level"]
+        if position == 35:
+            action = f"<a class=\"build\" href=\"build.php?id=35&amp;a=2&amp;k={token}\">Large celebration</a>"
+        elif level >= state.max_level(building["bid"]):
+            action = f"<p class=\"none\">Updated {name} Fully</p>"
+        else:
+            action = f"<a class=\"build\" href=\"village2.php?id={position}&amp;k={token}\">Upgrade to level {level + 1}.</a>"
+        extra = ""
+        if position == 30:
+            extra = f"<span class=\"info\">Available: {state.settlers}</span>"
+        return self.render("Build", (
+            f"<div id=\"build\" class=\"gid{building['bid']}\"><h1>{name} <span class=\"level\">level {level}</span></h1>"
+            f"{extra}{action}</div>"
+        ))
+
+    def train(self, position):
+        state = self.state
+        for field, value in self.form.items():
+            if field.startswith("tf[") and position == 30:
+                state.settlers += 3
+            elif field.startswith("tf["):
+                if state.training_queue and state.troops_trained >= state.training_queue:
+                    return self.render("Build", "<div id=\"build\"><p class=\"error\">The training queue is full</p></div>")
+                if state.training_resources and state.troops_trained >= state.training_resources:
+                    return self.render("Build", "<div id=\"build\"><p class=\"error\">Not enough resources</p></div>")
+                state.troops_trained += 1
+        return self.render("Build", "<div id=\"build\"><p>Training started</p></div>")
+
+    # Shop
+
+    def buy2(self, method):
+        state = self.state
+        job = "storage" if self.query.get("t") == "2" else "production"
+        if method == "POST" and self.query.get("Shop") == "done":
+            if not state.use_key(self.form.get("key", "")):
+                return self.render("Shop", "<p class=\"error\">Invalid key</p>")
+            state.purchases[job] += 1
+            return self.render("Shop", "<p>Purchase complete</p>")
+        key = state.issue_key()
+        return self.render("Shop", (
+            f"<form method=\"post\" action=\"buy2.php?t={self.query.get('t', '0')}&amp;Shop=done\">"
+            f"<input type=\"hidden\" name=\"key\" value=\"{key}\"></form>"
+        ))
+
+    # Troop movements
+
+    def v2v(self, method):
+        state = self.state
+        if method == "POST":
+            key = self.form.get("key") or self.form.get("k") or ""
+            if not state.use_key(key):
+                return self.render("Send troops", "<p class=\"error\">Invalid key</p>")
+            target = int(self.form.get("id", 0))
+            if self.form.get("t[10]") not in (None, "", "0"):
+                if not state.is_tile_empty(target):
+                    return self.render("Send troops", "<p class=\"error\">Village is occupied</p>")
+                state.occupied.add(target)
+                state.villages.append({"id": target, "name": "New village"})
+                state.pending_popup = True
+            else:
+                state.raids += 1
+            return self.render("Send troops", "<p>Troops sent</p>")
+        key = state.issue_key()
+        return self.render("Send troops", (
+            f"<form method=\"post\" action=\"v2v.php\"><input type=\"hidden\" name=\"id\" value=\"{self.query.get('id', '')}\">"
+            f"<input type=\"hidden\" name=\"key\" value=\"{key}\"><input type=\"hidden\" name=\"k\" value=\"{key}\"></form>"
+        ))
+
+    # Profile
+
+    def profile(self, method):
+        state = self.state
+        if method == "POST":
+            for village in state.villages:
+                if village["id"] == self.current_village and self.form.get("dname"):
+                    village["name"] = self.form["dname"]
+            return self.redirect("profile.php")
+        if self.query.get("t") == "1":
+            return self.render("Profile", "<form method=\"post\"><input name=\"dname\"></form>")
+        rows = "".join(
+            f"<tr><td><a href=\"village3.php?id={v['id']}\">{v['name']}</a></td></tr>"
+            for v in state.villages
+        )
+        return self.render("Profile", f"<table id=\"villages\"><tr><th>Villages</th></tr>{rows}</table>")
+
+    def dorf1(self, method):
+        return self.village1(method)
+
+
+ROUTES = {
+    "/": MockHandler.lobby,
+    "/game/servers": MockHandler.servers,
+    "/village1.php": MockHandler.village1,
+    "/village2.php": MockHandler.village2,
+    "/village3.php": MockHandler.village3,
+    "/map.php": MockHandler.map,
+    "/shownvill.php": MockHandler.shownvill,
+    "/build.php": MockHandler.build,
+    "/buy2.php": MockHandler.buy2,
+    "/v2v.php": MockHandler.v2v,
+    "/profile.php": MockHandler.profile,
+    "/dorf1.php": MockHandler.dorf1,
+}
+
+PUBLIC_ROUTES = {"/", "/game/servers"}
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, state=None, latency=0.0, jitter=0.0, error_rate=0.0, padding=0):
+        super().__init__(address, MockHandler)
+        self.state = state or GameState()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.padding = padding
+        self.login_path = "/"
+        self.counters_lock = threading.Lock()
+        self.counters = {}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, endpoint, name):
+        with self.counters_lock:
+            counters = self.counters.setdefault(endpoint, {"requests": 0, "errors": 0})
+            counters[name] += 1
+
+    def reset_counters(self):
+        with self.counters_lock:
+            self.counters = {}
+
+    def snapshot(self):
+        with self.counters_lock:
+            counters = {endpoint: dict(values) for endpoint, values in self.counters.items()}
+        state = self.state
+        return {
+            "endpoints": counters,
+            "purchases": dict(state.purchases),
+            "raids": state.raids,
+            "troops_trained": state.troops_trained,
+            "celebrations": state.celebrations,
+            "levels": state.levels,
+            "villages": len(state.villages)
+        }
+
+
+def start_server(host="127.0.0.1", port=0, **options):
+    """
+    Starts the mock server on a background thread and returns it; `port=0`
+    picks a free port (see `server.url`).
+    """
+    server = MockServer((host, port), **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in game server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="added delay per request in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra delay up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    parser.add_argument("--padding", type=int, default=20000, help="approximate filler bytes per page")
+    parser.add_argument("--key-uses", type=int, default=1, help="purchases accepted per shop key")
+    parser.add_argument("--key-ttl", type=float, default=0.0, help="shop key lifetime in seconds, 0 for none")
+    parser.add_argument("--villages", type=int, default=1, help="number of villages the player starts with")
+    parser.add_argument("--culture-points", type=int, default=10000, help="culture points the next village requires")
+    parser.add_argument("--training-queue", type=int, default=0, help="trainings accepted before the queue is full, 0 for no limit")
+    parser.add_argument("--training-resources", type=int, default=0, help="trainings paid for before resources run out, 0 for no limit")
+    parser.add_argument("--upgrade-page", action="store_true", help="answer upgrades with the building's page and its next token (hypothetical, the default village center answer models the live server)")
+    parser.add_argument("--build-reject-rate", type=float, default=0.0, help="fraction of build orders refused with a 200 page")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # Accept the credentials the scripts log in with
+    try:
+        with open('config.json', 'r') as file:
+            config = json.load(file)
+    except FileNotFoundError:
+        config = {}
+    state = GameState(
+        username=config.get("username", "scar"),
+        password=config.get("password", "satkabir"),
+        key_uses=args.key_uses,
+        key_ttl=args.key_ttl,
+        villages=args.villages,
+        required_culture_points=args.culture_points,
+        training_queue=args.training_queue,
+        training_resources=args.training_resources,
+        upgrade_page=args.upgrade_page,
+        build_reject_rate=args.build_reject_rate
+    )
+    server = MockServer((args.host, args.port), state=state, latency=args.latency, jitter=args.jitter,
+                        error_rate=args.error_rate, padding=args.padding)
+    logging.info(f"Mock game server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import time
+from config import settings, GAME_URL
+from limiter import limiter
+from metrics import registry, VERBOSE
+from tokens import extract_build_link, extract_build_token, is_build_page
+from building_cache import BuildingCache
+
+# Construction plans from "building" in config.json, run against any village.
+# Each entry is a position (`pid`), the building for it (`bid`) and the level
+# to reach (`loop`). Positions are independent, so up to the build queue's
+# worth of them are worked on at once. An entry the building cache knows to
+# be done costs no request, one already at its level costs one page load.
+# The game answers a rejected build with a 200 page as well, so a level only
+# counts once the building's page shows it; an upgrade that did not raise
+# the level ends the entry.
+# Where the server answers an upgrade with the building's page, the next
+# token is taken from that answer, so a level costs one request instead of
+# two. That is only shown against the mock's --upgrade-page mode; the live
+# server is not known to do it, and answering with the village center costs
+# two requests per level as before. Every run reports the requests it spent.
+# With a CheckpointStore the entries a village finished are saved as they
+# finish, so a restarted run picks the plan up where it stopped.
+
+config = settings
+
+# Building levels shared by every plan run, saved at the end of each
+building_cache = BuildingCache()
+
+# Village type -> [{pid, bid, loop}]
+PLANS = {plan["type"]: plan["construction"] for plan in config.get("building", [])}
+
+# Positions built or upgraded at once in one village. The server's own
+# build queue holds one order, so more than 1 only pays off if it is
+# measured to accept them
+BUILD_QUEUE = config.get("buildQueue", 1)
+
+BUILDING_NAMES = {
+    1: "Woodcutter", 2: "Clay Pit", 3: "Iron Mine", 4: "Cropland",
+    5: "Sawmill", 6: "Brickworks", 7: "Iron Foundry", 8: "Grain Mill",
+    9: "Bakery", 10: "Warehouse", 11: "Granary", 12: "Smithy",
+    13: "Armory", 14: "Tournament Square", 15: "Main Building", 16: "Rally Point",
+    17: "Marketplace", 18: "Embassy", 19: "Barracks", 20: "Stable",
+    21: "Siege Workshop", 22: "Academy", 23: "Cranny", 24: "Town Hall",
+    25: "Residence", 26: "Palace", 27: "Treasury", 28: "Trade Office",
+    33: "City Wall", 37: "Hero's Mansion", 40: "World Wonder", 44: "Christmas Tree"
+}
+
+
+def building_name(building_id):
+    return BUILDING_NAMES.get(building_id, f"Building {building_id}")
+
+
+def plan_for(village_type, building_config=None):
+    """The construction list for `village_type`, or from `building_config`."""
+    if building_config is not None:
+        return building_config["construction"]
+    if village_type not in PLANS:
+        raise KeyError(f"No construction plan for {village_type} villages in config.json")
+    return PLANS[village_type]
+
+
+def construction_link(content):
+    """The `&k=` token of a page's construct link, or None when it has none."""
+    href = extract_build_link(content)
+    if href is None or "&b=" not in href.replace("&amp;", "&"):
+        return None
+    return href.split("&k=")[-1]
+
+
+class PlanRun:
+    def __init__(self, client, village_id, name, construction, queue=None, cache=None, checkpoints=None):
+        self.client = client
+        self.village_id = village_id
+        self.name = name
+        self.construction = construction
+        self.queue = max(1, queue or BUILD_QUEUE)
+        self.cache = cache if cache is not None else building_cache
+        self.checkpoints = checkpoints
+        self.requests = 0
+        self.levels = 0
+        self.rejected = 0
+        self.unconfirmed = 0
+        self.skipped = 0
+        self.cached = 0
+        self.resumed = 0
+        self.chained = 0
+        self.started = None
+        self.finished = None
+
+    async def get(self, url, endpoint):
+        async with limiter.acquire(endpoint) as slot:
+            response = slot.observe(await self.client.get(url))
+        self.requests += 1
+        return response
+
+    async def build_page(self, position_id):
+        """Loads a build.php page and returns it with read_building's result."""
+        page = await self.get(f"{GAME_URL}/build.php?id={position_id}", "/build.php")
+        return page, self.cache.record(self.village_id, position_id, page.content)
+
+    def harvest(self, position_id, response):
+        """
+        Takes the building's page from a build or upgrade answer, when the
+        server sent one. Returns (page, read_building result) or None.
+        """
+        if not is_build_page(response.content):
+            return None
+        self.chained += 1
+        return response, self.cache.record(self.village_id, position_id, response.content)
+
+    def confirm(self, name, position_id, before, after, action):
+        """
+        Counts the levels an order added by comparing the page levels before
+        and after it. Returns False when the level did not go up.
+        """
+        if before is None or after is None:
+            # Without a readable level the order cannot be checked
+            self.unconfirmed += 1
+            return True
+        if after <= before:
+            self.rejected += 1
+            registry.incr(f"plans:{self.name}:rejected")
+            logging.warning(f"{name} at position {position_id} is still at level {after}; the {action} was not accepted")
+            return False
+        self.levels += after - before
+        registry.record_action(action, count=after - before)
+        return True
+
+    async def run_entry(self, entry):
+        """Works on one plan entry; returns True once it is at its level."""
+        position_id, building_id, target = entry["pid"], entry["bid"], entry["loop"]
+        name = building_name(building_id)
+        page, (current_id, level, full) = await self.build_page(position_id)
+        if full or (level is not None and level >= target):
+            self.skipped += 1
+            if VERBOSE:
+                logging.info(f"{name} at position {position_id} is already done. Skipping...")
+            return True
+
+        token = construction_link(page.content)
+        if token is not None:
+            response = await self.get(
+                f"{GAME_URL}/village2.php?id={position_id}&b={building_id}&k={token}", "/village2.php"
+            )
+            if response.status_code != 200:
+                logging.error(f"Failed to build {name} at position {position_id}: {response.status_code}")
+                return False
+            page, (current_id, level, full) = self.harvest(position_id, response) or await self.build_page(position_id)
+            # An empty site has no level, a new building starts at 1
+            if not self.confirm(name, position_id, 0, level, "construction"):
+                return False
+            logging.info(f"Built {name} at position {position_id} in village {self.village_id}")
+
+        # Without a readable level, upgrade until the page says it is done
+        for _ in range(target - level if level is not None else target):
+            if full or (level is not None and level >= target):
+                break
+            token = extract_build_token(page.content)
+            if token is None:
+                logging.error(f"Upgrade link not found for {name} at position {position_id}")
+                break
+            response = await self.get(f"{GAME_URL}/village2.php?id={position_id}&k={token}", "/village2.php")
+            if response.status_code != 200:
+                logging.error(f"Failed to upgrade {name} at position {position_id}: {response.status_code}")
+                break
+            before = level
+            page, (current_id, level, full) = self.harvest(position_id, response) or await self.build_page(position_id)
+            if not self.confirm(name, position_id, before, level, "upgrade"):
+                break
+        return bool(full) or (level is not None and level >= target)
+
+    @property
+    def checkpoint_job(self):
+        return f"plan:{self.village_id}:{self.name}"
+
+    async def run(self):
+        self.started = time.monotonic()
+        progress = None
+        if self.checkpoints is not None:
+            # Positions finished before a restart, in the order they finished
+            progress = self.checkpoints.progress(self.checkpoint_job, len(self.construction))
+            progress.setdefault("done", [])
+        entries = asyncio.Queue()
+        for entry in self.construction:
+            if progress is not None and entry["pid"] in progress["done"]:
+                self.skipped += 1
+                self.resumed += 1
+            elif self.cache.is_done(self.village_id, entry):
+                self.skipped += 1
+                self.cached += 1
+            else:
+                entries.put_nowait(entry)
+        # Always switched to, even with nothing left to build: callers train
+        # and send settlers from the village active after the plan
+        await self.get(f"{GAME_URL}/village2.php?vid={self.village_id}", "/village2.php")
+
+        async def worker():
+            while True:
+                try:
+                    entry = entries.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    done = await self.run_entry(entry)
+                except Exception as e:
+                    logging.error(f"Error at position {entry['pid']} in village {self.village_id}: {e}")
+                    continue
+                if done and progress is not None:
+                    progress["done"].append(entry["pid"])
+                    progress["completed"] = len(progress["done"])
+                    self.checkpoints.save()
+
+        await asyncio.gather(*(worker() for _ in range(min(self.queue, entries.qsize()))))
+        self.finished = time.monotonic()
+        self.cache.save()
+        # A finished plan starts from scratch next time; an unfinished one resumes
+        if progress is not None and progress["completed"] + self.cached >= len(self.construction):
+            self.checkpoints.clear(self.checkpoint_job)
+        registry.incr(f"plans:{self.name}:requests", self.requests)
+        registry.incr(f"plans:{self.name}:levels", self.levels)
+        registry.incr(f"plans:{self.name}:unconfirmed", self.unconfirmed)
+        registry.incr(f"plans:{self.name}:chained", self.chained)
+        logging.info(self.summary())
+        return self
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - (self.started or time.monotonic())
+
+    def summary(self):
+        per_level = self.requests / self.levels if self.levels else 0.0
+        return (
+            f"Plan {self.name} in village {self.village_id}: {self.levels} levels, "
+            f"{self.rejected} orders not accepted, {self.unconfirmed} unconfirmed, "
+            f"{self.skipped}/{len(self.construction)} entries already done ({self.cached} from cache, "
+            f"{self.resumed} from checkpoint), {self.requests} requests "
+            f"({per_level:.2f} per level, {self.chained} tokens from upgrade answers) in {self.elapsed:.1f}s"
+        )
+
+
+async def run_plan(client, village_id, village_type, building_config=None, queue=None, cache=None, checkpoints=None):
+    """
+    Builds village `village_id` to the plan for `village_type`; returns the
+    PlanRun. With `checkpoints` the run resumes from and saves to it.
+    """
+    construction = plan_for(village_type, building_config)
+    return await PlanRun(client, village_id, village_type, construction, queue, cache, checkpoints).run()
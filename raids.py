@@ -0,0 +1,128 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+from config import settings
+from metrics import registry
+from attack import attack_village, train_troops
+from session_manager import get_client
+from training import TrainingExecutor
+
+# Raid dispatcher: raids go out to every target at once with bounded
+# concurrency instead of one village at a time, and troop training runs in
+# its own lane, fed with the trainings owed for each raid sent, so raids
+# never wait for training. Each run writes per-target outcomes to a report.
+
+config = settings
+
+# Raids in flight at once
+RAID_CONCURRENCY = config.get("raidConcurrency", 32)
+
+# train_troops calls queued per raid sent, and how many run at once
+TRAININGS_PER_RAID = config.get("trainingsPerRaid", 200)
+TRAINING_CONCURRENCY = config.get("trainingConcurrency", 16)
+
+RAID_REPORT_FILE = "raid_report.json"
+
+
+class RaidReport:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.raids_finished = None
+        self.finished = None
+        self.targets = {}
+        self.trainings = Counter()
+
+    def record(self, village_id, name, outcome, seconds):
+        self.targets[village_id] = {"name": name, "outcome": outcome, "ms": round(seconds * 1000, 1)}
+
+    @property
+    def outcomes(self):
+        return Counter(target["outcome"] for target in self.targets.values())
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    # Raids per minute over the raid lane alone; training may run on after it
+    @property
+    def raids_per_minute(self):
+        elapsed = (self.raids_finished or time.monotonic()) - self.started
+        return self.outcomes["sent"] / elapsed * 60 if elapsed else 0.0
+
+    def summary(self):
+        outcomes = ", ".join(f"{outcome}={count}" for outcome, count in sorted(self.outcomes.items()))
+        return (
+            f"{len(self.targets)} targets in {self.elapsed:.1f}s ({outcomes}), "
+            f"{self.raids_per_minute:.1f} raids/min, {self.trainings['trained']} trainings sent"
+        )
+
+    def save(self, path=RAID_REPORT_FILE):
+        data = {
+            "seconds": round(self.elapsed, 3),
+            "raids_per_minute": round(self.raids_per_minute, 2),
+            "outcomes": dict(self.outcomes),
+            "trainings": dict(self.trainings),
+            "targets": self.targets
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(data, file, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+
+async def dispatch_raids(cookies, villages, concurrency=None, trainings_per_raid=None, training_concurrency=None):
+    """
+    Raids every `(name, v2v_url)` target in `villages` and trains troops in a
+    separate lane. Returns a RaidReport once both lanes are done.
+    """
+    concurrency = max(1, concurrency or RAID_CONCURRENCY)
+    trainings_per_raid = TRAININGS_PER_RAID if trainings_per_raid is None else trainings_per_raid
+    training_concurrency = max(1, training_concurrency or TRAINING_CONCURRENCY)
+    report = RaidReport()
+    # One executor for the whole lane; it stops training for the rest of the
+    # run once the server reports a full queue or no resources
+    executor = TrainingExecutor(get_client(cookies))
+    report.trainings = executor.outcomes
+    targets = asyncio.Queue()
+    trainings = asyncio.Queue()
+    for village in villages:
+        targets.put_nowait(village)
+
+    async def raider():
+        while True:
+            try:
+                name, village_url = targets.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            village_id = village_url.split('=')[-1]
+            started = time.monotonic()
+            outcome = await attack_village(cookies, village_url)
+            report.record(village_id, name, outcome, time.monotonic() - started)
+            if outcome == "sent":
+                for _ in range(trainings_per_raid):
+                    trainings.put_nowait(village_id)
+
+    async def trainer():
+        while True:
+            village_id = await trainings.get()
+            try:
+                await train_troops(cookies, village_id, executor)
+            except Exception as e:
+                registry.incr("action:training:failed")
+                logging.error(f"Error training troops: {e}")
+            finally:
+                trainings.task_done()
+
+    trainers = [asyncio.ensure_future(trainer()) for _ in range(training_concurrency)]
+    try:
+        await asyncio.gather(*(raider() for _ in range(min(concurrency, max(len(villages), 1)))))
+        report.raids_finished = time.monotonic()
+        await trainings.join()
+    finally:
+        for task in trainers:
+            task.cancel()
+    report.finished = time.monotonic()
+    return report
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from config import settings
+from limiter import limiter
+from login import login, validate_session
+from metrics import registry
+from supervisor import Supervisor
+
+# Runs the shop and celebration loops as concurrent jobs instead of one after
+# the other. All jobs share the adaptive limiter's global window; the gate
+# below splits it between them by weight and lends an idle job's share to the
+# busy ones, so a job that finishes early frees its slots for the rest.
+# The jobs share one login: the scheduler logs in once per run, and a
+# restarted job only logs in again when that session has died.
+
+config = settings
+
+# Relative share of the concurrency budget per job
+SHOP_WEIGHTS = config.get("shopWeights", {"production": 4, "storage": 2, "celebration": 1})
+DEFAULT_WEIGHT = 1
+
+# Seconds between two progress reports
+REPORT_INTERVAL = 30.0
+
+
+class WeightedGate:
+    def __init__(self, weights, limit=None):
+        self.weights = weights
+        self.limit = limit or (lambda: limiter.window)
+        self.in_flight = {}
+        self.waiting = {}
+        self.condition = None
+        self.loop = None
+
+    def _weight(self, job):
+        return self.weights.get(job, DEFAULT_WEIGHT)
+
+    def share(self, job):
+        """Slots the job is entitled to among the jobs that currently want any."""
+        active = [name for name in self.in_flight if self.in_flight[name] or self.waiting[name]]
+        total = sum(self._weight(name) for name in active) or self._weight(job)
+        return max(1.0, self.limit() * self._weight(job) / total)
+
+    def _can_enter(self, job):
+        if sum(self.in_flight.values()) >= self.limit():
+            return False
+        if self.in_flight[job] < self.share(job):
+            return True
+        # Over its share a job may only borrow slots nobody else is waiting for
+        return not any(
+            self.waiting[other] and self.in_flight[other] < self.share(other)
+            for other in self.in_flight if other != job
+        )
+
+    @asynccontextmanager
+    async def slot(self, job):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.condition = asyncio.Condition()
+            self.loop = loop
+        self.in_flight.setdefault(job, 0)
+        self.waiting.setdefault(job, 0)
+        async with self.condition:
+            self.waiting[job] += 1
+            try:
+                await self.condition.wait_for(lambda: self._can_enter(job))
+            finally:
+                self.waiting[job] -= 1
+            self.in_flight[job] += 1
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.in_flight[job] -= 1
+                self.condition.notify_all()
+
+
+class ShopScheduler:
+    def __init__(self, supervisor=None, weights=None, checkpoints=None):
+        self.supervisor = supervisor or Supervisor()
+        self.gate = WeightedGate(weights or SHOP_WEIGHTS)
+        self.checkpoints = checkpoints
+        self.jobs = {}
+        self.cookies = None
+        self.login_lock = None
+
+    def add(self, name, total, run):
+        """
+        Adds a job of `total` units. `run(loop_count, cookies, progress, gate)`
+        performs the remaining units, counting them in `progress["completed"]`
+        and running each one inside `gate(name)`. With a checkpoint store the
+        job resumes from its last saved count.
+        """
+        progress = self.checkpoints.progress(name, total) if self.checkpoints else {"completed": 0}
+        self.jobs[name] = (total, run, progress)
+
+    async def _revalidate(self):
+        # One job at a time, so a dead session is replaced by a single login
+        # however many jobs restart together
+        async with self.login_lock:
+            if not await validate_session(self.cookies):
+                logging.info("Session expired, logging in again")
+                self.cookies = await login(force=True)
+        return self.cookies
+
+    def _factory(self, name):
+        total, run, progress = self.jobs[name]
+        started = False
+
+        # A restart checks the shared session and only runs what is still left
+        async def job():
+            nonlocal started
+            cookies = await self._revalidate() if started else self.cookies
+            started = True
+            remaining = total - progress["completed"]
+            if remaining > 0:
+                await run(remaining, cookies, progress, self.gate.slot)
+        return job
+
+    def progress(self):
+        return {name: (progress["completed"], total) for name, (total, run, progress) in self.jobs.items()}
+
+    def report(self):
+        lines = []
+        for name, (completed, total) in self.progress().items():
+            rate = registry.action_rate(name)["per_second"]
+            lines.append(f"{name}: {completed}/{total} ({rate:.1f}/s)")
+        return ", ".join(lines)
+
+    async def _report_periodically(self):
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL)
+            logging.info(f"Progress: {self.report()}")
+
+    async def run(self):
+        """Runs all jobs concurrently and returns the wall clock time taken."""
+        started = time.monotonic()
+        self.login_lock = asyncio.Lock()
+        self.cookies = await login()
+        tasks = [asyncio.ensure_future(self._report_periodically())]
+        if self.checkpoints:
+            tasks.append(asyncio.ensure_future(self.checkpoints.save_periodically()))
+        try:
+            await self.supervisor.run_all({name: self._factory(name) for name in self.jobs})
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        # The round is done, the next one starts from zero
+        if self.checkpoints:
+            self.checkpoints.clear(*self.jobs)
+        elapsed = time.monotonic() - started
+        logging.info(f"Finished {', '.join(self.jobs)} in {elapsed:.1f}s: {self.report()}")
+        return elapsed
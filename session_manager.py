@@ -0,0 +1,137 @@
+import httpx
+import logging
+import time
+from contextlib import asynccontextmanager
+from metrics import registry, VERBOSE
+
+# Shared keep-alive client used by every async module. Opening a new
+# httpx.AsyncClient per coroutine costs a fresh TCP+TLS handshake each time,
+# so all modules borrow this one instead.
+
+# Connection pool limits for the shared client
+MAX_CONNECTIONS = 50
+MAX_KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_EXPIRY = 30.0
+
+# Default timeout for requests made through the shared client
+TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+headers = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.6261.112 Safari/537.36'
+}
+
+_client = None
+_cookies = None
+
+# httpx logs every request at INFO; keep that out of the logs unless asked for
+if not VERBOSE:
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Pool statistics: a request that did not open a new TCP connection reused a
+# pooled one (hit), a request that had to connect is a miss.
+pool_stats = {
+    "requests": 0,
+    "connections": 0,
+}
+
+
+async def _on_request(request):
+    pool_stats["requests"] += 1
+
+    # Count new TCP connections through httpcore's trace extension, and mark
+    # the request that opened one so callers can tell hits from misses
+    async def trace(event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            pool_stats["connections"] += 1
+            request.extensions["new_connection"] = True
+
+    request.extensions["trace"] = trace
+    request.extensions["metrics_started"] = time.monotonic()
+
+
+# Per-endpoint latency and status counters for every response
+async def _on_response(response):
+    started = response.request.extensions.get("metrics_started")
+    if started is not None:
+        registry.record_request(response.request.url.path or "/", time.monotonic() - started, response.status_code)
+
+
+def _create_client(cookies):
+    limits = httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY
+    )
+    return httpx.AsyncClient(
+        cookies=cookies,
+        headers=headers,
+        limits=limits,
+        timeout=TIMEOUT,
+        event_hooks={'request': [_on_request], 'response': [_on_response]}
+    )
+
+
+def get_client(cookies=None):
+    """
+    Returns the shared client, creating it on first use. Passing a new cookie
+    jar (e.g. after a re-login) rebinds the client to it.
+    """
+    global _client, _cookies
+    if _client is None or _client.is_closed:
+        _client = _create_client(cookies)
+        _cookies = cookies
+        logging.debug("Created shared HTTP client")
+    elif cookies is not None and cookies is not _cookies:
+        _client.cookies = cookies
+        _cookies = cookies
+    return _client
+
+
+@asynccontextmanager
+async def borrow_client(cookies=None):
+    """
+    Drop-in replacement for `async with httpx.AsyncClient(cookies=cookies)`
+    that yields the shared client and leaves it open afterwards.
+    """
+    yield get_client(cookies)
+
+
+@asynccontextmanager
+async def session_client(cookies):
+    """
+    Yields a client of its own for a second game session (a separate login),
+    with the same pool settings and hooks, and closes it afterwards. The
+    game keeps the active village per session, so work that needs a
+    different active village at the same time cannot share the client.
+    """
+    client = _create_client(cookies)
+    try:
+        yield client
+    finally:
+        await client.aclose()
+
+
+async def close_client():
+    global _client, _cookies
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _cookies = None
+
+
+def get_pool_stats():
+    hits = max(0, pool_stats["requests"] - pool_stats["connections"])
+    return {
+        "requests": pool_stats["requests"],
+        "hits": hits,
+        "misses": pool_stats["connections"],
+        "hit_rate": hits / pool_stats["requests"] if pool_stats["requests"] else 0.0
+    }
+
+
+def log_pool_stats():
+    stats = get_pool_stats()
+    logging.info(
+        f"HTTP pool: {stats['requests']} requests, {stats['hits']} hits, "
+        f"{stats['misses']} misses ({stats['hit_rate']:.1%} reuse)"
+    )
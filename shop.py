@@ -0,0 +1,311 @@
+import asyncio
+import contextlib
+import logging
+import time
+from config import settings, GAME_URL
+from tokens import extract_input_value
+from streaming import fetch_until, until_input
+from limiter import limiter
+from metrics import registry, VERBOSE
+from forms import SHOP_FORM, FORM_HEADERS
+from key_cache import KeyCache, MaxUses, MaxAge, rules_from_config
+
+# Pipelined buy2.php shop engine. Every purchase needs a fresh `key` from the
+# shop page followed by the `Shop=done` POST. Instead of paying two serial
+# round trips per unit, each worker prefetches its next key while the current
+# purchase is in flight, and `window` workers run side by side.
+
+logger = logging.getLogger(__name__)
+
+config = settings
+
+SHOP_URL = f"{GAME_URL}/buy2.php"
+
+# Shop page type per job
+SHOP_TYPES = {
+    "production": 0,
+    "storage": 2
+}
+
+# Upper bound on purchases in flight; the shared adaptive limiter decides
+# how many of them actually run at once
+SHOP_WINDOW = config.get("shopWindow", 16)
+
+# Upper bound on purchases per second, 0 for no limit
+SHOP_RATE = config.get("shopRate", 0)
+
+# Text the server puts in a purchase response when the key was not accepted
+STALE_KEY_MARKERS = config.get("shopRejectMarkers", ["Invalid key", "Wrong key"])
+
+# Backoff after a rejected key, doubled for every consecutive rejection
+MIN_BACKOFF = 0.5
+MAX_BACKOFF = 10.0
+
+# Consecutive rejections after which the session is treated as dead
+MAX_REJECTIONS = 10
+
+# When a fetched key gets invalidated, see key_cache.py
+KEY_RULES = rules_from_config(config)
+
+# Measure how long keys stay valid before the first run instead of using
+# KEY_RULES; probing spends real purchases, which count towards the job
+KEY_CALIBRATE = config.get("shopKeyCalibrate", False)
+
+# Calibration probe limits
+PROBE_USES = 16
+PROBE_AGES = (0.5, 1.0, 2.0, 4.0, 8.0)
+
+# Calibrated rules per shop type, measured once per process
+calibrated_rules = {}
+
+
+# Raised when the shop page has no key, usually because the session died
+class ShopKeyError(Exception):
+    pass
+
+
+# Spaces out purchases so the engine never exceeds `rate` per second
+class RatePacer:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# Default gate for run_shop: every purchase may start right away
+def open_gate(job):
+    return contextlib.nullcontext()
+
+
+async def fetch_key(client, shop_type):
+    async with limiter.acquire("/buy2.php") as slot:
+        response, data, found = await fetch_until(client, f"{SHOP_URL}?t={shop_type}", until_input('key'))
+        slot.observe(response)
+        key = extract_input_value(data, 'key')
+        if key is None:
+            slot.fail()
+        return key
+
+
+def is_rejected(response):
+    if response.status_code >= 400:
+        return True
+    return any(marker in response.text for marker in STALE_KEY_MARKERS)
+
+
+async def purchase(client, shop_type, key):
+    data = SHOP_FORM.render(key=key)
+    async with limiter.acquire("/buy2.php") as slot:
+        response = await client.post(f"{SHOP_URL}?t={shop_type}&Shop=done", headers=FORM_HEADERS, content=data)
+        slot.observe(response)
+        if is_rejected(response):
+            slot.fail()
+            return False
+        return True
+
+
+async def calibrate_key_uses(client, shop_type, limit=PROBE_USES):
+    """
+    Counts how many purchases one key is accepted for, spending at most
+    `limit` of them. Returns the use limit (0 when no limit was found, None
+    when `limit` ran out before the probe could tell) and the number of
+    purchases made.
+    """
+    key = await fetch_key(client, shop_type)
+    if key is None:
+        raise ShopKeyError("Failed to find key for calibration")
+    probes = min(limit, PROBE_USES)
+    uses = 0
+    while uses < probes and await purchase(client, shop_type, key):
+        uses += 1
+    if uses < probes:
+        max_uses = max(uses, 1)
+    elif probes < PROBE_USES:
+        return None, uses
+    else:
+        # A key that survived every probe is reused until it gets rejected
+        max_uses = 0
+    logger.info(f"Calibrated shop keys: {max_uses or 'unlimited'} uses")
+    return max_uses, uses
+
+
+async def probe_key_age(client, shop_type, age_rule, take, on_result, stop):
+    """
+    Holds one fresh key per probe age and tries it once that age is reached,
+    all probes at once. `age_rule` is set to half the first age refused.
+    Every probe purchase is a unit of the job: `take()` claims one (False
+    when none are left), `on_result(accepted)` settles it. Probes still
+    waiting when `stop` is set give up. Returns True when every age was
+    tried.
+    """
+    async def probe(age):
+        key = await fetch_key(client, shop_type)
+        if key is None:
+            return None
+        try:
+            await asyncio.wait_for(stop.wait(), age)
+            return None
+        except asyncio.TimeoutError:
+            pass
+        if not take():
+            return None
+        accepted = await purchase(client, shop_type, key)
+        on_result(accepted)
+        return accepted
+
+    results = await asyncio.gather(*(probe(age) for age in PROBE_AGES))
+    refused = [age for age, accepted in zip(PROBE_AGES, results) if accepted is False]
+    if refused:
+        age_rule.seconds = min(refused) / 2
+    complete = None not in results
+    if complete:
+        logger.info(f"Calibrated shop keys: {age_rule.seconds or 'no'} max age")
+    return complete
+
+
+async def run_shop(client, job, loop_count, window=None, rate=None, progress=None, pacer=None, gate=None):
+    """
+    Runs `loop_count` purchases of the given shop job ("production" or
+    "storage") with up to `window` purchases in flight. Returns the number of
+    successful purchases. `pacer` replaces the per-call RatePacer, e.g. with
+    a budget shared across processes. Each purchase runs inside `gate(job)`,
+    which lets a scheduler share one concurrency budget between jobs.
+    """
+    shop_type = SHOP_TYPES[job]
+    window = max(1, window or SHOP_WINDOW)
+    if pacer is None:
+        pacer = RatePacer(rate if rate is not None else SHOP_RATE)
+    gate = gate or open_gate
+    state = {"remaining": loop_count, "completed": 0, "rejected": 0}
+
+    # Purchases made while calibrating count towards the job
+    def count_purchases(count):
+        state["remaining"] -= count
+        state["completed"] += count
+        if progress is not None:
+            progress["completed"] += count
+        registry.record_action(job, count=count)
+
+    # An age probe purchase takes a unit like a worker does; a refused one is
+    # handed back
+    def take_unit():
+        if state["remaining"] <= 0:
+            return False
+        state["remaining"] -= 1
+        return True
+
+    def settle_probe(accepted):
+        if not accepted:
+            state["remaining"] += 1
+            return
+        state["completed"] += 1
+        if progress is not None:
+            progress["completed"] += 1
+        registry.record_action(job)
+
+    # The probes never spend more than the units the job has left
+    age_probe = None
+    stop_probe = asyncio.Event()
+    if KEY_CALIBRATE and loop_count > 0 and shop_type not in calibrated_rules:
+        max_uses, accepted = await calibrate_key_uses(client, shop_type, loop_count)
+        count_purchases(accepted)
+        # A job too small to tell keeps KEY_RULES and calibrates on a later run
+        if max_uses is not None:
+            age_rule = MaxAge(0)
+            calibrated_rules[shop_type] = [MaxUses(max_uses), age_rule]
+            # Until the age probe finishes, reused keys are refreshed on rejection
+            if max_uses != 1:
+                age_probe = asyncio.ensure_future(
+                    probe_key_age(client, shop_type, age_rule, take_unit, settle_probe, stop_probe)
+                )
+    rules = calibrated_rules.get(shop_type, KEY_RULES) if KEY_CALIBRATE else KEY_RULES
+    keys = KeyCache(lambda: fetch_key(client, shop_type), rules, name=job)
+
+    async def worker():
+        backoff = MIN_BACKOFF
+        rejections = 0
+        next_key = None
+        while state["remaining"] > 0:
+            state["remaining"] -= 1
+            try:
+                async with gate(job):
+                    pending, next_key = next_key, None
+                    key = await pending if pending is not None else await keys.get()
+                    if key is None:
+                        raise ShopKeyError(f"Failed to find key for increasing {job}")
+
+                    await pacer.wait()
+                    # Fetch the key for the next purchase while this one is in flight
+                    if state["remaining"] > 0:
+                        next_key = asyncio.ensure_future(keys.get())
+                    started = time.monotonic()
+                    accepted = await purchase(client, shop_type, key)
+            except ShopKeyError:
+                raise
+            except Exception as e:
+                logger.error(f"Error during {job} increase: {e}")
+                continue
+
+            if accepted:
+                backoff = MIN_BACKOFF
+                rejections = 0
+                state["completed"] += 1
+                if progress is not None:
+                    progress["completed"] += 1
+                registry.record_action(job, time.monotonic() - started)
+                if VERBOSE:
+                    logger.info(f"{job.capitalize()} Increased")
+            else:
+                state["remaining"] += 1
+                if next_key is not None:
+                    next_key.cancel()
+                    next_key = None
+                # A reused key that ran out is expected: retry with a fresh one
+                if keys.reject(key):
+                    continue
+                # The key went stale: retry this unit with a fresh key after a pause
+                state["rejected"] += 1
+                registry.incr(f"action:{job}:rejected")
+                rejections += 1
+                if rejections >= MAX_REJECTIONS:
+                    raise ShopKeyError(f"Shop keeps rejecting {job} keys")
+                logger.warning(f"Shop rejected {job} key, backing off {backoff:.1f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+        if next_key is not None:
+            next_key.cancel()
+
+    tasks = []
+    try:
+        while True:
+            tasks = [asyncio.ensure_future(worker()) for _ in range(min(window, max(state["remaining"], 1)))]
+            await asyncio.gather(*tasks)
+            # Probes still waiting give up; units handed back by refused
+            # probes are bought by another round of workers
+            stop_probe.set()
+            if age_probe is not None and not age_probe.done():
+                await age_probe
+            if state["remaining"] <= 0:
+                break
+        # An unfinished age probe is repeated on the next run
+        if age_probe is not None and not age_probe.result():
+            calibrated_rules.pop(shop_type, None)
+    finally:
+        for task in tasks:
+            task.cancel()
+        if age_probe is not None and not age_probe.done():
+            age_probe.cancel()
+            calibrated_rules.pop(shop_type, None)
+    if keys.hits:
+        logger.info(f"{job.capitalize()} key cache hit rate {keys.hit_rate:.1%}")
+    return state["completed"]
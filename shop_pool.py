@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import time
+import httpx
+from config import settings
+from metrics import registry
+from shop import run_shop, ShopKeyError
+
+# Multi-process mode for the shop loops. The loop count is sharded across
+# worker processes, each with its own event loop and warm keep-alive client,
+# so key parsing runs on every core. All workers draw from one token bucket in
+# shared memory, which keeps the combined request rate under a global budget,
+# and the parent folds the workers' counters and latencies into its own
+# progress and metrics.
+#
+# Experimental: against the mock server it is still slower than the
+# in-process engine, and it cannot take part in the scheduler's gate, so
+# resource.py only uses it for jobs run outside a ShopScheduler.
+
+config = settings
+
+# Worker processes per shop job; 0 or 1 keeps the loops in-process
+SHOP_PROCESSES = config.get("shopProcesses", 0)
+
+# Global request budget per second across all workers, 0 for no limit
+SHOP_PROCESS_RATE = config.get("shopProcessRate", 0)
+
+# Every purchase costs a key fetch and a POST
+REQUESTS_PER_PURCHASE = 2
+
+# How often the parent collects progress from the workers
+POLL_INTERVAL = 0.5
+
+
+class SharedTokenBucket:
+    """
+    Token bucket in shared memory. `wait()` has the same interface as
+    shop.RatePacer, so it can be handed to run_shop as its pacer.
+    """
+
+    def __init__(self, rate, burst=None, context=multiprocessing):
+        self.rate = float(rate)
+        self.burst = float(burst or max(self.rate, REQUESTS_PER_PURCHASE))
+        self.lock = context.Lock()
+        self.tokens = context.RawValue('d', self.burst)
+        self.updated = context.RawValue('d', time.time())
+
+    def reserve(self, cost):
+        """Takes `cost` tokens and returns how long to wait until they are covered."""
+        if not self.rate:
+            return 0.0
+        with self.lock:
+            now = time.time()
+            tokens = min(self.burst, self.tokens.value + (now - self.updated.value) * self.rate) - cost
+            self.tokens.value = tokens
+            self.updated.value = now
+        return max(0.0, -tokens / self.rate)
+
+    async def wait(self, cost=REQUESTS_PER_PURCHASE):
+        delay = self.reserve(cost)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# run_shop's progress dict backed by this worker's slot in a shared array
+class SharedProgress:
+    def __init__(self, counts, index):
+        self.counts = counts
+        self.index = index
+
+    def __getitem__(self, key):
+        return self.counts[self.index]
+
+    def __setitem__(self, key, value):
+        self.counts[self.index] = value
+
+
+def shard(loop_count, processes):
+    base, extra = divmod(loop_count, processes)
+    return [base + (1 if index < extra else 0) for index in range(processes) if base or index < extra]
+
+
+async def _run_worker(index, job, loop_count, cookies, bucket, counts, latencies):
+    from session_manager import get_client, close_client
+
+    jar = httpx.Cookies()
+    for name, value, domain, path in cookies:
+        jar.set(name, value, domain=domain, path=path)
+    client = get_client(jar)
+
+    # Raw request latencies, sent back to the parent with the counters
+    async def on_response(response):
+        started = response.request.extensions.get("metrics_started")
+        if started is not None:
+            latencies.append(time.monotonic() - started)
+
+    client.event_hooks["response"].append(on_response)
+    try:
+        return await run_shop(client, job, loop_count, progress=SharedProgress(counts, index), pacer=bucket)
+    finally:
+        await close_client()
+
+
+def _worker(index, job, loop_count, cookies, bucket, counts, results):
+    from log_setup import setup_logging
+
+    # Only the parent writes app.log, workers log to the console
+    setup_logging(log_file=None)
+    error = None
+    latencies = []
+    try:
+        asyncio.run(_run_worker(index, job, loop_count, cookies, bucket, counts, latencies))
+    except Exception as e:
+        error = str(e)
+    results.put((index, error, dict(registry.counters), latencies))
+
+
+async def run_shop_pool(job, loop_count, cookies, processes=None, rate=None, progress=None, latencies=None):
+    """
+    Runs `loop_count` purchases of the given shop job across `processes`
+    worker processes under one shared rate budget. Returns the number of
+    successful purchases; raises ShopKeyError if any worker failed. The
+    workers' request latencies go into the registry, and into `latencies`
+    (a list, in seconds) when one is passed.
+    """
+    processes = max(1, processes or SHOP_PROCESSES)
+    logging.info(f"{job.capitalize()}: running across {processes} processes (experimental)")
+    rate = SHOP_PROCESS_RATE if rate is None else rate
+    context = multiprocessing.get_context("spawn")
+    bucket = SharedTokenBucket(rate, context=context)
+    shards = shard(loop_count, processes)
+    counts = context.RawArray('q', len(shards))
+    results = context.Queue()
+    jar = [(cookie.name, cookie.value, cookie.domain, cookie.path) for cookie in cookies.jar]
+
+    workers = [
+        context.Process(target=_worker, args=(index, job, count, jar, bucket, counts, results), daemon=True)
+        for index, count in enumerate(shards)
+    ]
+    for worker in workers:
+        worker.start()
+
+    reported = 0
+    errors = {}
+    finished = set()
+
+    def collect():
+        nonlocal reported
+        completed = sum(counts)
+        if completed > reported:
+            registry.record_action(job, count=completed - reported)
+            if progress is not None:
+                progress["completed"] += completed - reported
+            reported = completed
+        while True:
+            try:
+                index, error, counters, worker_latencies = results.get_nowait()
+            except queue.Empty:
+                break
+            finished.add(index)
+            if error:
+                errors[index] = error
+            for seconds in worker_latencies:
+                registry.observe(f"pool:{job}:requests", seconds)
+            if latencies is not None:
+                latencies.extend(worker_latencies)
+            for name, value in counters.items():
+                # Completed purchases were already folded in from the shared counts
+                if name != f"action:{job}":
+                    registry.incr(name, value)
+
+    try:
+        while len(finished) < len(workers):
+            await asyncio.sleep(POLL_INTERVAL)
+            collect()
+            for index, worker in enumerate(workers):
+                if index not in finished and worker.exitcode not in (None, 0):
+                    finished.add(index)
+                    errors[index] = f"worker exited with code {worker.exitcode}"
+        collect()
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+
+    logging.info(f"{job.capitalize()}: {reported}/{loop_count} purchases across {len(workers)} processes")
+    if errors:
+        raise ShopKeyError(f"{len(errors)} {job} workers failed: {'; '.join(sorted(set(errors.values())))}")
+    return reported
@@ -0,0 +1,135 @@
+import logging
+from urllib.parse import urlsplit
+from config import settings
+from session_manager import get_pool_stats
+from tokens import scan_input_value, scan_build_link
+
+# Early-terminating reads for pages where the bot only needs a marker or a
+# token near the top: the response is streamed and the read stops as soon as
+# the condition is met, instead of downloading and decoding the whole page.
+# A small remainder is still read to the end, since dropping it closes the
+# keep-alive connection and the next request pays for a new handshake.
+
+config = settings
+
+# Per-endpoint accounting, keyed by URL path
+stats = {}
+
+# When the unread remainder of a response is at most this many bytes it is
+# drained instead of dropped, so the keep-alive connection can be reused.
+# Only a larger remainder closes the connection early; 0 always closes it.
+DRAIN_LIMIT = config.get("streamDrainLimit", 16 * 1024)
+
+
+def _endpoint_stats(url):
+    endpoint = urlsplit(str(url)).path or "/"
+    if endpoint not in stats:
+        stats[endpoint] = {
+            "requests": 0,
+            "early_stops": 0,
+            "bytes_read": 0,
+            "bytes_saved": 0,
+            "drained": 0,
+            "pool_hits": 0,
+            "pool_misses": 0,
+            "full_size": 0
+        }
+    return stats[endpoint]
+
+
+# Stop conditions are called as until(data, start) each time a chunk
+# arrives; `start` is where the new bytes begin, and each condition looks
+# back only as far as a match could straddle the previous chunk.
+
+def until_marker(marker):
+    """
+    Stop condition: the page contains `marker`.
+    """
+    if isinstance(marker, str):
+        marker = marker.encode('utf-8')
+    overlap = len(marker) - 1
+    return lambda data, start=0: data.find(marker, max(0, start - overlap)) != -1
+
+
+def until_input(name):
+    """
+    Stop condition: the `<input name=...>` tag has been read completely.
+    """
+    return lambda data, start=0: scan_input_value(data, name, start) is not None
+
+
+def until_build_link():
+    """
+    Stop condition: the first `a.build` link has been read completely.
+    """
+    return lambda data, start=0: scan_build_link(data, start) is not None
+
+
+async def _drain(response, chunks, remaining):
+    # Reads the rest of the body when it is known (or, without a
+    # Content-Length, expected) to be small; gives up past DRAIN_LIMIT
+    if remaining is None or remaining > DRAIN_LIMIT:
+        return False
+    start = response.num_bytes_downloaded
+    async for chunk in chunks:
+        if response.num_bytes_downloaded - start > DRAIN_LIMIT:
+            return False
+    return True
+
+
+async def fetch_until(client, url, until, method="GET", **kwargs):
+    """
+    Streams `url` and stops reading once `until(data, start)` is true for the
+    bytes read so far. Returns `(response, data, found)`; `data` is the
+    (possibly partial) decoded body.
+    """
+    endpoint = _endpoint_stats(url)
+    endpoint["requests"] += 1
+    data = bytearray()
+    found = False
+    async with client.stream(method, url, **kwargs) as response:
+        chunks = response.aiter_bytes()
+        async for chunk in chunks:
+            start = len(data)
+            data += chunk
+            if until(data, start):
+                found = True
+                break
+
+        content_length = response.headers.get("content-length")
+        total = int(content_length) if content_length and content_length.isdigit() else None
+        drained = False
+        if not response.is_closed:
+            # Without a Content-Length fall back to the largest full body seen
+            size = total if total is not None else endpoint["full_size"] or None
+            remaining = size - response.num_bytes_downloaded if size is not None else None
+            drained = await _drain(response, chunks, remaining)
+        stopped_early = not response.is_closed
+        downloaded = response.num_bytes_downloaded
+
+    endpoint["bytes_read"] += downloaded
+    endpoint["pool_misses" if response.request.extensions.get("new_connection") else "pool_hits"] += 1
+    if drained:
+        endpoint["drained"] += 1
+    if stopped_early:
+        endpoint["early_stops"] += 1
+        size = total if total is not None else endpoint["full_size"]
+        endpoint["bytes_saved"] += max(0, size - downloaded)
+    else:
+        endpoint["full_size"] = max(endpoint["full_size"], downloaded)
+    return response, bytes(data), found
+
+
+def log_stream_stats():
+    for endpoint, endpoint_stats in sorted(stats.items()):
+        logging.info(
+            f"{endpoint}: {endpoint_stats['requests']} requests, "
+            f"{endpoint_stats['early_stops']} stopped early, "
+            f"{endpoint_stats['drained']} drained, "
+            f"{endpoint_stats['bytes_read']} bytes read, "
+            f"{endpoint_stats['bytes_saved']} bytes saved, "
+            f"{endpoint_stats['pool_hits']} pool hits, "
+            f"{endpoint_stats['pool_misses']} pool misses"
+        )
+    pool = get_pool_stats()
+    logging.info(f"HTTP pool overall: {pool['hits']} hits, {pool['misses']} misses ({pool['hit_rate']:.1%} reuse)")
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import time
+
+# In-process replacement for respawning `python main.py` on every failure.
+# A failed job is restarted on the same event loop, so the shared HTTP client,
+# the login session and any loop progress survive the restart.
+
+# Restart backoff, doubled after each consecutive failure
+MIN_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+
+# A job that ran this long before failing resets its backoff
+RESET_AFTER = 60.0
+
+
+class Supervisor:
+    def __init__(self, min_backoff=MIN_BACKOFF, max_backoff=MAX_BACKOFF, max_restarts=None):
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.max_restarts = max_restarts
+        self.stats = {}
+
+    def _job_stats(self, name):
+        if name not in self.stats:
+            self.stats[name] = {
+                "restarts": 0,
+                "failures": 0,
+                "recovery_times": [],
+                "last_error": None
+            }
+        return self.stats[name]
+
+    async def run(self, name, factory):
+        """
+        Runs `factory()` until it returns, restarting it with backoff whenever
+        it raises. `factory` must build a fresh coroutine on every call.
+        """
+        stats = self._job_stats(name)
+        backoff = self.min_backoff
+        while True:
+            started = time.monotonic()
+            try:
+                return await factory()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failed_at = time.monotonic()
+                stats["failures"] += 1
+                stats["last_error"] = repr(e)
+                if failed_at - started >= RESET_AFTER:
+                    backoff = self.min_backoff
+                if self.max_restarts is not None and stats["restarts"] >= self.max_restarts:
+                    logging.error(f"Job {name} failed and reached the restart limit: {e}")
+                    raise
+                logging.error(f"Job {name} failed: {e}. Restarting in {backoff:.1f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                stats["restarts"] += 1
+                stats["recovery_times"].append(time.monotonic() - failed_at)
+
+    async def run_all(self, jobs):
+        """
+        Runs several jobs concurrently; `jobs` maps job names to factories.
+        Only the job that fails is restarted.
+        """
+        names = list(jobs)
+        results = await asyncio.gather(*(self.run(name, jobs[name]) for name in names))
+        return dict(zip(names, results))
+
+    def summary(self):
+        lines = []
+        for name, stats in self.stats.items():
+            times = stats["recovery_times"]
+            average = sum(times) / len(times) if times else 0.0
+            lines.append(
+                f"{name}: {stats['restarts']} restarts, "
+                f"average time to recover {average:.2f}s"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from config import settings, GAME_URL
+from attack import get_player_villages
+
+# Cached raid target list. The player's villages are kept in targets.json as
+# id -> name per player with the time they were fetched. A run starts from
+# the cached list right away; once it is older than the TTL the profile page
+# is fetched again in the background and diffed against the cache, so only
+# villages that were actually added or removed change the target set.
+
+config = settings
+
+TARGETS_FILE = "targets.json"
+
+# Seconds before a cached village list is refreshed
+TARGETS_TTL = config.get("targetsTtl", 3600)
+
+
+def to_targets(villages, excluded_village_ids):
+    """(name, v2v_url) pairs sorted by name, as get_player_villages returns them."""
+    targets = [
+        (name, f"{GAME_URL}/v2v.php?id={village_id}")
+        for village_id, name in villages.items() if village_id not in excluded_village_ids
+    ]
+    return sorted(targets, key=lambda x: x[0])
+
+
+class TargetRegistry:
+    def __init__(self, path=TARGETS_FILE, ttl=TARGETS_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.players = self._load()
+        self.added = {}
+        self.removed = {}
+        self.refreshing = None
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(self.players, file, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def is_fresh(self, uid):
+        entry = self.players.get(str(uid))
+        return entry is not None and time.time() - entry["fetched"] < self.ttl
+
+    async def refresh(self, cookies, uid):
+        """
+        Fetches the player's villages and diffs them against the cache.
+        Returns (added, removed) as id -> name dicts.
+        """
+        villages = {
+            url.split('=')[-1]: name
+            for name, url in await get_player_villages(cookies, uid, [])
+        }
+        cached = self.players.get(str(uid), {}).get("villages", {})
+        self.added = {village_id: name for village_id, name in villages.items() if village_id not in cached}
+        self.removed = {village_id: name for village_id, name in cached.items() if village_id not in villages}
+        self.players[str(uid)] = {"fetched": int(time.time()), "villages": villages}
+        self.save()
+        if cached and (self.added or self.removed):
+            logging.info(f"Targets for player {uid}: {len(self.added)} added, {len(self.removed)} removed")
+        return self.added, self.removed
+
+    async def get(self, cookies, uid, excluded_village_ids):
+        """
+        Returns the player's villages as (name, v2v_url) pairs. A cached list
+        is returned at once and, when stale, refreshed in the background; see
+        `refreshing`. Without a cache the profile is fetched now.
+        """
+        entry = self.players.get(str(uid))
+        if entry is None:
+            await self.refresh(cookies, uid)
+            entry = self.players[str(uid)]
+        elif not self.is_fresh(uid):
+            self.refreshing = asyncio.ensure_future(self.refresh(cookies, uid))
+        return to_targets(entry["villages"], excluded_village_ids)
+
+    async def changes(self, excluded_village_ids):
+        """
+        Waits for a background refresh, if one is running, and returns the
+        added villages as targets plus the ids of the removed ones.
+        """
+        if self.refreshing is None:
+            return [], []
+        try:
+            await self.refreshing
+        except Exception as e:
+            logging.error(f"Failed to refresh targets: {e}")
+            return [], []
+        finally:
+            self.refreshing = None
+        return to_targets(self.added, excluded_village_ids), list(self.removed)
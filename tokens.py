@@ -0,0 +1,179 @@
+import re
+from bs4 import BeautifulSoup
+
+# Fast extraction of the single values the bot needs from a page: the `key`
+# and `k` form inputs and the `&k=` token in `a.build` links. The raw bytes are
+# scanned once for the known pattern, and a full BeautifulSoup parse only runs
+# when the scan misses.
+
+# Stats for the scan versus the bs4 fallback
+stats = {
+    "fast": 0,
+    "fallback": 0
+}
+
+_input_name_patterns = {}
+
+# Attributes are preceded by whitespace, so `data-value=` or `data-href=` is
+# never taken for the attribute itself
+_VALUE_PATTERN = re.compile(rb'''\svalue\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))''', re.I)
+_HREF_PATTERN = re.compile(rb'''\shref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))''', re.I)
+_BUILD_CLASS_PATTERN = re.compile(rb'''<a\b[^>]*\sclass\s*=\s*["']?build["'\s>]''', re.I)
+_DIV_TAG_PATTERN = re.compile(rb'''<(/?)div\b''', re.I)
+
+
+def _to_bytes(content):
+    if isinstance(content, str):
+        return content.encode('utf-8')
+    return content
+
+
+def _to_text(content):
+    if isinstance(content, bytes):
+        return content.decode('utf-8', errors='replace')
+    return content
+
+
+def _first_group(match):
+    return next(group for group in match.groups() if group is not None).decode('utf-8')
+
+
+def _input_name_pattern(name):
+    if name not in _input_name_patterns:
+        _input_name_patterns[name] = re.compile(
+            rb'''\sname\s*=\s*["']?''' + re.escape(name.encode()) + rb'''(?:["'\s/>])''', re.I
+        )
+    return _input_name_patterns[name]
+
+
+def _scan_input_value(content, name, pos=0):
+    match = _input_name_pattern(name).search(content, pos)
+    if match is None:
+        return None
+    start = content.rfind(b'<', 0, match.start())
+    end = content.find(b'>', match.end() - 1)
+    if start == -1 or end == -1 or not content[start + 1:start + 6].lower() == b'input':
+        return None
+    value = _VALUE_PATTERN.search(content, start, end)
+    if value is None:
+        return None
+    return _first_group(value)
+
+
+def _tag_start(data, pos):
+    # Start of the tag that may still be open at `pos`, so a rescan from
+    # there sees it whole
+    if pos <= 0:
+        return 0
+    start = data.rfind(b'<', 0, pos)
+    return 0 if start == -1 else start
+
+
+def scan_input_value(content, name, pos=0):
+    """
+    Byte scan only: returns the input's value, or None without falling back
+    to bs4. Used on partially read pages; `pos` skips the bytes before the
+    tag that was still open there.
+    """
+    data = _to_bytes(content)
+    return _scan_input_value(data, name, _tag_start(data, pos))
+
+
+def extract_input_value(content, name):
+    """
+    Returns the value of the `<input name=...>` field, or None when the page
+    has no such input. `content` may be bytes (preferred) or text.
+    """
+    value = _scan_input_value(_to_bytes(content), name)
+    if value is not None:
+        stats["fast"] += 1
+        return value
+
+    stats["fallback"] += 1
+    soup = BeautifulSoup(_to_text(content), 'html.parser')
+    element = soup.find('input', {'name': name})
+    if element is None:
+        return None
+    return element.get('value')
+
+
+def _scan_build_link(data, pos=0):
+    match = _BUILD_CLASS_PATTERN.search(data, pos)
+    if match is None:
+        return None
+    end = data.find(b'>', match.start())
+    if end == -1:
+        return None
+    href = _HREF_PATTERN.search(data, match.start(), end)
+    if href is None:
+        return None
+    return _first_group(href).replace('&amp;', '&')
+
+
+def scan_build_link(content, pos=0):
+    """
+    Byte scan only: returns the first `a.build` href at or after the tag
+    open at `pos`, or None.
+    """
+    data = _to_bytes(content)
+    return _scan_build_link(data, _tag_start(data, pos))
+
+
+def extract_build_link(content):
+    """
+    Returns the href of the first `a.build` link on the page, or None.
+    """
+    href = _scan_build_link(_to_bytes(content))
+    if href is not None:
+        stats["fast"] += 1
+        return href
+
+    stats["fallback"] += 1
+    soup = BeautifulSoup(_to_text(content), 'html.parser')
+    link = soup.find('a', {'class': 'build', 'href': True})
+    if link is None:
+        return None
+    return link['href']
+
+
+def extract_build_token(content):
+    """
+    Returns the `&k=` CSRF token of the first `a.build` link, or None.
+    """
+    href = extract_build_link(content)
+    if href is None or '&k=' not in href:
+        return None
+    return href.split('&k=')[-1]
+
+
+def is_build_page(content):
+    """
+    True when a response is a building's build.php page, i.e. it has the
+    `#build` block with the next upgrade link or the fully upgraded note.
+    """
+    return b'id="build"' in _to_bytes(content)
+
+
+def _div_end(data, start):
+    # End of the div opened before `start`, counting the divs nested in it;
+    # the end of the page when it is never closed
+    depth = 1
+    for tag in _DIV_TAG_PATTERN.finditer(data, start):
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            return tag.start()
+    return len(data)
+
+
+def is_fully_upgraded(content):
+    """
+    True when the `#build` block of a build.php page reports the building as
+    fully upgraded. Only the block itself is searched, not the rest of the page.
+    """
+    data = _to_bytes(content)
+    start = data.find(b'id="build"')
+    if start != -1:
+        return b'Fully' in data[start:_div_end(data, start)]
+    soup = BeautifulSoup(_to_text(content), 'html.parser')
+    build_div = soup.find('div', {'id': 'build'})
+    return build_div is not None and 'Fully' in build_div.text
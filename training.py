@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from collections import Counter
+from config import settings, GAME_URL
+from limiter import limiter
+from metrics import registry, VERBOSE
+
+# Troop training executor. All submissions go through one pooled client with
+# a cap on requests in flight. Every submission is sent: each POST queues a
+# batch of its own, so two identical forms are not duplicates. Once the
+# server says the training queue is full or resources are exhausted the
+# executor stops sending for the rest of the run.
+
+config = settings
+
+# Praetorians in the barracks of the current village
+TRAINING_URL = f"{GAME_URL}/build.php?id=25"
+TRAINING_FORM = "tf%5B2%5D=521117636153554570000&s1.x=50&s1.y=8"
+TRAINING_HEADERS = {
+    "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
+    "accept-language": "en-US,en;q=0.9",
+    "content-type": "application/x-www-form-urlencoded",
+    "sec-ch-ua": "\"Chromium\";v=\"122\", \"Not(A:Brand\";v=\"24\", \"Google Chrome\";v=\"122\"",
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": "\"Windows\"",
+    "sec-fetch-dest": "document",
+    "sec-fetch-mode": "navigate",
+    "sec-fetch-site": "same-origin",
+    "sec-fetch-user": "?1",
+    "upgrade-insecure-requests": "1"
+}
+
+# Training requests in flight at once
+TRAINING_IN_FLIGHT = config.get("trainingInFlight", 4)
+
+# Text in a training response that means no further training can go through
+STOP_MARKERS = config.get("trainingStopMarkers", {
+    "queue_full": ["training queue is full"],
+    "no_resources": ["Not enough resources"]
+})
+
+
+class TrainingExecutor:
+    def __init__(self, client, max_in_flight=None):
+        self.client = client
+        self.semaphore = asyncio.Semaphore(max(1, max_in_flight or TRAINING_IN_FLIGHT))
+        self.stopped = None
+        self.outcomes = Counter()
+
+    def _stop_reason(self, response):
+        for reason, markers in STOP_MARKERS.items():
+            if any(marker in response.text for marker in markers):
+                return reason
+        return None
+
+    async def _send(self, url, data):
+        async with limiter.acquire("/build.php") as slot:
+            response = slot.observe(await self.client.post(url, headers=TRAINING_HEADERS, data=data))
+        if response.status_code != 200:
+            registry.incr("action:training:failed")
+            logging.error(f"Error during Praetorians training: {response.status_code}")
+            return f"http_{response.status_code}"
+        reason = self._stop_reason(response)
+        if reason:
+            if self.stopped is None:
+                logging.info(f"Stopping troop training: {reason.replace('_', ' ')}")
+            self.stopped = reason
+            return reason
+        registry.record_action("training")
+        if VERBOSE:
+            logging.info("Training Praetorians in the current village")
+        return "trained"
+
+    async def submit(self, url=TRAINING_URL, data=TRAINING_FORM):
+        """
+        Sends one training request and returns its outcome: "trained",
+        "queue_full", "no_resources", "stopped", "http_<status>" or "error".
+        """
+        if self.stopped:
+            outcome = "stopped"
+        else:
+            try:
+                async with self.semaphore:
+                    outcome = "stopped" if self.stopped else await self._send(url, data)
+            except Exception as e:
+                logging.error(f"Error during Praetorians training: {e}")
+                outcome = "error"
+        self.outcomes[outcome] += 1
+        return outcome
+
+    async def submit_many(self, count, url=TRAINING_URL, data=TRAINING_FORM):
+        return await asyncio.gather(*(self.submit(url, data) for _ in range(count)))
@@ -1,14 +1,19 @@
 import httpx
 from bs4 import BeautifulSoup
-from config import read_config, write_config
+from config import read_config, write_config, GAME_URL
 from login import login
+from session_manager import borrow_client
+from tokens import extract_input_value
+from streaming import fetch_until, until_input, until_marker
 import logging
+from log_setup import setup_logging
 import json
-from building import construct_capital, construct_artefact, construct_secondary
+from forms import RENAME_FORM, SETTLER_FORM, FORM_HEADERS
+from construction import construct_capital, construct_artefact, construct_secondary
 import asyncio
 
 # Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging()
 
 # Read configuration from config.json
 config = read_config()  # Assuming you have a function to read the JSON configuration
@@ -23,35 +28,22 @@ residence_id = config["villages"]["residenceID"]
 settler_id = config["villages"]["settlerID"]
 
 async def rename_latest_village(cookies):
-    async with httpx.AsyncClient(cookies=cookies) as client:
+    async with borrow_client(cookies) as client:
         latest_village = config["villages"]["villages"][-1]
         village_id = latest_village["villageID"]
         expected_name = latest_village["villageName"]
 
         # Navigate to the latest village
-        await client.get(f"https://fun.gotravspeed.com/village2.php?vid={village_id}")
+        await client.get(f"{GAME_URL}/village2.php?vid={village_id}")
 
         # Navigate to the profile settings page
-        await client.get("https://fun.gotravspeed.com/profile.php?t=1")
+        await client.get(f"{GAME_URL}/profile.php?t=1")
 
         # Prepare the form data for renaming the village
-        form_data = {
-            'e': '1',
-            'oldavatar': '',
-            'jahr': '',
-            'monat': '0',
-            'tag': '',
-            'be1': '',
-            'mw': '0',
-            'ort': '',
-            'dname': expected_name,
-            'be2': '',
-            's1.x': '26',
-            's1.y': '16'
-        }
+        form_data = RENAME_FORM.render(dname=expected_name)
 
         # Send the POST request to rename the village
-        rename_response = await client.post("https://fun.gotravspeed.com/profile.php", data=form_data)
+        rename_response = await client.post(f"{GAME_URL}/profile.php", headers=FORM_HEADERS, content=form_data)
         if rename_response.status_code == 200:
             logging.info(f"Renamed latest village to {expected_name}")
         else:
@@ -59,8 +51,8 @@ async def rename_latest_village(cookies):
 
 
 async def get_village_ids_and_update_json(cookies):
-    async with httpx.AsyncClient(cookies=cookies) as client:
-        response = await client.get("https://fun.gotravspeed.com/profile.php")
+    async with borrow_client(cookies) as client:
+        response = await client.get(f"{GAME_URL}/profile.php")
         soup = BeautifulSoup(response.text, 'html.parser')
         village_rows = soup.find('table', id='villages').find_all('tr')[1:]  # Skip the header row
         print(f"Number of village rows: {len(village_rows)}")  # Debugging
@@ -119,8 +111,8 @@ def generate_spiral_village_ids(center_id, existing_villages_count, max_radius=2
 
 
 async def train_settlers(cookies, village_id, residence_id, settler_id):
-    async with httpx.AsyncClient(cookies=cookies) as client:
-        response = await client.get(f"https://fun.gotravspeed.com/build.php?id={residence_id}")
+    async with borrow_client(cookies) as client:
+        response = await client.get(f"{GAME_URL}/build.php?id={residence_id}")
         if response.status_code != 200:
             logging.error(f"Failed to access the residence page for village ID {village_id}")
             return
@@ -130,7 +122,7 @@ async def train_settlers(cookies, village_id, residence_id, settler_id):
             's1.x': '73',
             's1.y': '2'
         }
-        response = await client.post(f"https://fun.gotravspeed.com/build.php?id={residence_id}", data=form_data)
+        response = await client.post(f"{GAME_URL}/build.php?id={residence_id}", data=form_data)
         if response.status_code != 200:
             logging.error(f"Failed to train settlers in village ID {village_id}")
             return
@@ -139,29 +131,27 @@ async def train_settlers(cookies, village_id, residence_id, settler_id):
 
 async def find_empty_village_spot(cookies, center_id, radius, existing_villages):
     spiral_village_ids = generate_spiral_village_ids(center_id, radius)
-    async with httpx.AsyncClient(cookies=cookies) as client:
+    async with borrow_client(cookies) as client:
         for village_id in spiral_village_ids:
             if village_id not in existing_villages:
-                response = await client.get(f"https://fun.gotravspeed.com/village3.php?id={village_id}")
-                if '»building a new village' in response.text:
+                response, page, found = await fetch_until(client, f"{GAME_URL}/village3.php?id={village_id}", until_marker('»building a new village'))
+                if found:
                     await send_settlers_to_new_village(cookies, village_id)
                     return village_id
     return None
 
 async def send_settlers_to_new_village(cookies, new_village_id):
-    async with httpx.AsyncClient(cookies=cookies) as client:
+    async with borrow_client(cookies) as client:
         # Fetch the v2v.php page to extract the key
-        response = await client.get(f"https://fun.gotravspeed.com/v2v.php?id={new_village_id}")
-        key = extract_key_from_v2v_page(response.text)
+        response, page, found = await fetch_until(client, f"{GAME_URL}/v2v.php?id={new_village_id}", until_input('key'))
+        key = extract_key_from_v2v_page(page)
 
         # Send settlers to the new village
-        response = await client.post("https://fun.gotravspeed.com/v2v.php", data={
-            'id': new_village_id,
-            'c': 4,
-            't[1]': 0, 't[2]': 0, 't[3]': 0, 't[4]': 0, 't[5]': 0,
-            't[6]': 0, 't[7]': 0, 't[8]': 0, 't[9]': 0, 't[10]': 3,
-            'key': key
-        })
+        response = await client.post(
+            f"{GAME_URL}/v2v.php",
+            headers=FORM_HEADERS,
+            content=SETTLER_FORM.render(id=new_village_id, key=key)
+        )
         if response.status_code == 200:
             logging.info(f"Settlers sent to new village at {new_village_id}")
             return True
@@ -170,11 +160,11 @@ async def send_settlers_to_new_village(cookies, new_village_id):
             return False
 
 async def handle_new_village_popup(cookies, village_id):
-    async with httpx.AsyncClient(cookies=cookies) as client:
-        response = await client.get(f"https://fun.gotravspeed.com/village1.php?id={village_id}")
+    async with borrow_client(cookies) as client:
+        response = await client.get(f"{GAME_URL}/village1.php?id={village_id}")
         if response.status_code == 302 and response.headers.get('location') == 'shownvill.php':
             # Navigate to shownvill.php to acknowledge the new village
-            await client.get("https://fun.gotravspeed.com/shownvill.php")
+            await client.get(f"{GAME_URL}/shownvill.php")
             logging.info("New village popup handled.")
             return True
         elif "New village founded!" in response.text:
@@ -192,21 +182,17 @@ async def expand_village(cookies, center_id, radius, existing_villages):
             logging.info("Settlers sent to new village.")
             # Wait a bit and then navigate to village1.php twice
             await asyncio.sleep(2)
-            async with httpx.AsyncClient(cookies=cookies) as client:
-                await client.get(f"https://fun.gotravspeed.com/shownvill.php")
+            async with borrow_client(cookies) as client:
+                await client.get(f"{GAME_URL}/shownvill.php")
                 await asyncio.sleep(1)
-                await client.get(f"https://fun.gotravspeed.com/village1.php")
+                await client.get(f"{GAME_URL}/village1.php")
         else:
             logging.error("Expansion failed at sending settlers.")
     else:
         logging.error("Expansion failed at finding empty village spot.")
 
 def extract_key_from_v2v_page(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    key_input = soup.find('input', {'name': 'key'})
-    if key_input:
-        return key_input.get('value')
-    return None
+    return extract_input_value(html_content, 'key')
 
 
 async def main():
@@ -1,13 +1,14 @@
 import httpx
 from bs4 import BeautifulSoup
-from config import read_config, write_config
+from config import read_config, write_config, GAME_URL
 from login import login
 import logging
+from log_setup import setup_logging
 import json
-from building import construct_capital, construct_artefact, construct_secondary
+from construction import construct_capital, construct_artefact, construct_secondary
 
 # Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging()
 
 # Read configuration from config.json
 config = read_config()
@@ -17,7 +18,7 @@ MAX_VILLAGES = 100  # Adjust as needed
 
 async def get_village_ids_and_update_json(cookies):
     async with httpx.AsyncClient(cookies=cookies) as client:
-        response = await client.get("https://fun.gotravspeed.com/profile.php")
+        response = await client.get(f"{GAME_URL}/profile.php")
         soup = BeautifulSoup(response.text, 'html.parser')
         village_links = soup.find_all('a', href=lambda href: href and 'village3.php?id=' in href)
         village_data = []
@@ -51,7 +52,7 @@ async def get_village_ids_and_update_json(cookies):
 async def rename_village(village_id, new_name, cookies):
     async with httpx.AsyncClient(cookies=cookies) as client:
         # Get the profile page for the village to retrieve the form data
-        response = await client.get(f"https://fun.gotravspeed.com/profile.php?vid={village_id}&t=1")
+        response = await client.get(f"{GAME_URL}/profile.php?vid={village_id}&t=1")
         soup = BeautifulSoup(response.text, 'html.parser')
         # Find the current village name and other form data
         current_name = soup.find('input', {'name': 'dname'})['value']
@@ -70,7 +71,7 @@ async def rename_village(village_id, new_name, cookies):
             's1.y': '1'
         }
         # Send a POST request to update the village name
-        await client.post(f"https://fun.gotravspeed.com/profile.php?vid={village_id}", data=form_data)
+        await client.post(f"{GAME_URL}/profile.php?vid={village_id}", data=form_data)
 
 async def rename_all_villages(cookies, config):
     print("Debugging config in rename_all_villages:", config)  # Add this line for debugging
@@ -79,7 +80,7 @@ async def rename_all_villages(cookies, config):
             village_id = village["villageID"]
             expected_name = village["villageName"]
 
-            response = await client.get(f"https://fun.gotravspeed.com/profile.php?vid={village_id}&t=1")
+            response = await client.get(f"{GAME_URL}/profile.php?vid={village_id}&t=1")
             if response.status_code != 200:
                 logging.error(f"Failed to access the profile page for village ID {village_id}")
                 continue
@@ -98,7 +99,7 @@ async def rename_all_villages(cookies, config):
 
 async def train_settlers(cookies, village_id, residence_id, settler_id):
     async with httpx.AsyncClient(cookies=cookies) as client:
-        response = await client.get(f"https://fun.gotravspeed.com/build.php?id={residence_id}")
+        response = await client.get(f"{GAME_URL}/build.php?id={residence_id}")
         if response.status_code != 200:
             logging.error(f"Failed to access the residence page for village ID {village_id}")
             return
@@ -108,7 +109,7 @@ async def train_settlers(cookies, village_id, residence_id, settler_id):
             's1.x': '73',
             's1.y': '2'
         }
-        response = await client.post(f"https://fun.gotravspeed.com/build.php?id={residence_id}", data=form_data)
+        response = await client.post(f"{GAME_URL}/build.php?id={residence_id}", data=form_data)
         if response.status_code != 200:
             logging.error(f"Failed to train settlers in village ID {village_id}")
             return
@@ -134,7 +135,7 @@ async def find_empty_village_spot(cookies, center_id, radius, existing_villages)
     async with httpx.AsyncClient(cookies=cookies) as client:
         for village_id in spiral_village_ids:
             if village_id not in existing_villages:
-                response = await client.get(f"https://fun.gotravspeed.com/village3.php?id={village_id}")
+                response = await client.get(f"{GAME_URL}/village3.php?id={village_id}")
                 if '»building a new village' in response.text:
                     await send_settlers_to_new_village(cookies, village_id)
                     return village_id
@@ -152,13 +153,13 @@ async def send_settlers_to_new_village(cookies, new_village_id):
         'Sec-Fetch-Mode': 'navigate',
         'Sec-Fetch-User': '?1',
         'Sec-Fetch-Dest': 'document',
-        'Referer': 'https://fun.gotravspeed.com',
+        'Referer': GAME_URL,
         'Upgrade-Insecure-Requests': '1'
     }
 
     async with httpx.AsyncClient(cookies=cookies) as client:
         # Send settlers to the new village
-        response = await client.post("https://fun.gotravspeed.com/v2v.php", data={
+        response = await client.post(f"{GAME_URL}/v2v.php", data={
             'id': new_village_id,
             'c': 4,
             't[1]': 0, 't[2]': 0, 't[3]': 0, 't[4]': 0, 't[5]': 0,
@@ -171,7 +172,7 @@ async def send_settlers_to_new_village(cookies, new_village_id):
             if "shownvill.php" in str(response.url):
                 logging.info("Handling new village popup...")
                 await asyncio.sleep(1)  # Wait for 1 second
-                response = await client.get("https://fun.gotravspeed.com/village1.php", headers=headers)
+                response = await client.get(f"{GAME_URL}/village1.php", headers=headers)
                 break  # Exit the loop if the shownvill.php page is found
 
         logging.info(f"Settlers sent to new village at {new_village_id}")
@@ -188,14 +189,14 @@ async def handle_new_village_popup(cookies):
         'Sec-Fetch-Mode': 'navigate',
         'Sec-Fetch-User': '?1',
         'Sec-Fetch-Dest': 'document',
-        'Referer': 'https://fun.gotravspeed.com',
+        'Referer': GAME_URL,
         'Upgrade-Insecure-Requests': '1'
     }
     async with httpx.AsyncClient(cookies=cookies) as client:
-        response = await client.get("https://fun.gotravspeed.com/village1.php", headers=headers)
+        response = await client.get(f"{GAME_URL}/village1.php", headers=headers)
         if "shownvill.php" in str(response.url):
             print("Handling new village popup...")
-            await client.get("https://fun.gotravspeed.com/village1.php", headers=headers)
+            await client.get(f"{GAME_URL}/village1.php", headers=headers)
 
 
 
@@ -247,7 +248,7 @@ async def check_village_find_and_train_settlers(cookies):
 async def wait_for_new_village_popup(cookies, village_id):
     async with httpx.AsyncClient(cookies=cookies) as client:
         for _ in range(5):  # Try 5 times
-            response = await client.get(f"https://fun.gotravspeed.com/village1.php?id={village_id}")
+            response = await client.get(f"{GAME_URL}/village1.php?id={village_id}")
             if "New village founded!" in response.text:
                 logging.info("New village popup found.")
                 return True
@@ -1,9 +1,14 @@
 import httpx
 from bs4 import BeautifulSoup
-from config import read_config, write_config
-from building import construct_secondary, construct_capital, construct_artefact
+from config import read_config, write_config, GAME_URL
+from construction import construct_secondary, construct_capital, construct_artefact
 from login import login
+from session_manager import borrow_client
+from tokens import extract_input_value
+from streaming import fetch_until, until_input, until_marker
+from forms import settler_form, FORM_HEADERS
 import logging
+from log_setup import setup_logging
 import json
 import asyncio
 
@@ -18,24 +23,27 @@ def load_settlements():
 
 
 # Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging()
 
 # Load configuration and potential village IDs
 config = read_config()
 
+# Settler form for this server's `k` key input
+SETTLER_FORM = settler_form('k')
+
 # Extract global variables from configuration
 MAX_VILLAGES = config["maxVillages"]
 residence_id = config["villages"]["residenceID"]
 settler_id = config["villages"]["settlerID"]
 
 async def rename_latest_village(cookies):
-    async with httpx.AsyncClient(cookies=cookies) as client:
+    async with borrow_client(cookies) as client:
         latest_village = config["villages"]["villages"][-1]
         village_id = latest_village["villageID"]
         expected_name = latest_village["villageName"]
 
         # Navigate to the profile settings page
-        await client.get(f"https://fun.gotravspeed.com/dorf1.php?newdid={village_id}&e=1")
+        await client.get(f"{GAME_URL}/dorf1.php?newdid={village_id}&e=1")
 
         # Prepare the form data for renaming the village
         form_data = {
@@ -44,7 +52,7 @@ async def rename_latest_village(cookies):
         }
 
         # Send the POST request to rename the village
-        rename_response = await client.post(f"https://fun.gotravspeed.com/dorf1.php?newdid={village_id}&e=1", data=form_data)
+        rename_response = await client.post(f"{GAME_URL}/dorf1.php?newdid={village_id}&e=1", data=form_data)
         if rename_response.status_code == 200:
             logging.info(f"Renamed village ID {village_id} to {expected_name}")
         else:
@@ -53,8 +61,8 @@ async def rename_latest_village(cookies):
 
 
 async def get_village_ids_and_update_json(cookies):
-    async with httpx.AsyncClient(cookies=cookies) as client:
-        response = await client.get("https://fun.gotravspeed.com/profile.php")
+    async with borrow_client(cookies) as client:
+        response = await client.get(f"{GAME_URL}/profile.php")
         soup = BeautifulSoup(response.text, 'html.parser')
         village_rows = soup.find('table', id='villages').find_all('tr')[1:]  # Skip the header row
 
@@ -91,8 +99,8 @@ async def get_village_ids_and_update_json(cookies):
 
 
 async def train_settlers(cookies, village_id, residence_id, settler_id):
-    async with httpx.AsyncClient(cookies=cookies) as client:
-        response = await client.get(f"https://fun.gotravspeed.com/build.php?id={residence_id}")
+    async with borrow_client(cookies) as client:
+        response = await client.get(f"{GAME_URL}/build.php?id={residence_id}")
         if response.status_code != 200:
             logging.error(f"Failed to access the residence page for village ID {village_id}")
             return
@@ -102,7 +110,7 @@ async def train_settlers(cookies, village_id, residence_id, settler_id):
             's1.x': '73',
             's1.y': '2'
         }
-        response = await client.post(f"https://fun.gotravspeed.com/build.php?id={residence_id}", data=form_data)
+        response = await client.post(f"{GAME_URL}/build.php?id={residence_id}", data=form_data)
         if response.status_code != 200:
             logging.error(f"Failed to train settlers in village ID {village_id}")
             return
@@ -111,33 +119,28 @@ async def train_settlers(cookies, village_id, residence_id, settler_id):
 
 async def find_empty_village_spot(cookies):
     unsettled_village_ids = load_settlements()
-    async with httpx.AsyncClient(cookies=cookies) as client:
+    async with borrow_client(cookies) as client:
         for village_id in unsettled_village_ids:
-            response = await client.get(f"https://fun.gotravspeed.com/village3.php?id={village_id}")
-            if '»building a new village' in response.text:
+            response, page, found = await fetch_until(client, f"{GAME_URL}/village3.php?id={village_id}", until_marker('»building a new village'))
+            if found:
                 return village_id
     return None
 
 async def send_settlers_and_handle_popup(cookies, new_village_id):
-    async with httpx.AsyncClient(cookies=cookies) as client:
+    async with borrow_client(cookies) as client:
         # Fetch the v2v.php page to extract the key
-        response = await client.get(f"https://fun.gotravspeed.com/v2v.php?id={new_village_id}")
-        soup = BeautifulSoup(response.text, 'html.parser')
-        key_input = soup.find('input', {'name': 'k'})
-        if key_input:
-            key = key_input.get('value')
-        else:
+        response, page, found = await fetch_until(client, f"{GAME_URL}/v2v.php?id={new_village_id}", until_input('k'))
+        key = extract_input_value(page, 'k')
+        if key is None:
             logging.error("Failed to extract CSRF key for sending settlers.")
             return False
 
         # Send settlers to the new village
-        response = await client.post("https://fun.gotravspeed.com/v2v.php", data={
-            'id': new_village_id,
-            'c': 4,
-            't[1]': 0, 't[2]': 0, 't[3]': 0, 't[4]': 0, 't[5]': 0,
-            't[6]': 0, 't[7]': 0, 't[8]': 0, 't[9]': 0, 't[10]': 3,
-            'k': key
-        })
+        response = await client.post(
+            f"{GAME_URL}/v2v.php",
+            headers=FORM_HEADERS,
+            content=SETTLER_FORM.render(id=new_village_id, k=key)
+        )
         if response.status_code == 200:
             logging.info(f"Settlers sent to new village at {new_village_id}")
             # Update settlements.json to mark the village as settled
@@ -152,15 +155,15 @@ async def send_settlers_and_handle_popup(cookies, new_village_id):
             await asyncio.sleep(2)
 
             # Check for the new village popup and handle it
-            response = await client.get(f"https://fun.gotravspeed.com/village1.php?id={new_village_id}")
+            response = await client.get(f"{GAME_URL}/village1.php?id={new_village_id}")
             if response.status_code == 302 and response.headers.get('location') == 'shownvill.php':
                 # Navigate to shownvill.php to acknowledge the new village
-                await client.get("https://fun.gotravspeed.com/shownvill.php")
+                await client.get(f"{GAME_URL}/shownvill.php")
                 logging.info("New village popup handled.")
                 # Wait for 1 second before continuing
                 await asyncio.sleep(1)
                 # Navigate to village1.php again to ensure the popup is handled
-                await client.get(f"https://fun.gotravspeed.com/village1.php?id={new_village_id}")
+                await client.get(f"{GAME_URL}/village1.php?id={new_village_id}")
                 return True
             elif "New village founded!" in response.text:
                 logging.info("New village popup handled.")
@@ -1,12 +1,16 @@
-import httpx
+from session_manager import borrow_client, log_pool_stats
+from streaming import fetch_until, until_marker, log_stream_stats
 import asyncio
 import json
 import logging
+from log_setup import setup_logging
 from bs4 import BeautifulSoup
 from login import login
+from config import GAME_URL
+from metrics import registry
 
 # Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging()
 
 # Global variables
 MAX_VILLAGES = 1500
@@ -43,9 +47,10 @@ def save_settlements(settlements):
 
 # Check if a village is empty and can be settled
 async def is_village_empty(cookies, village_id):
-    async with httpx.AsyncClient(cookies=cookies) as client:
-        response = await client.get(f"https://fun.gotravspeed.com/village3.php?id={village_id}")
-        return '»building a new village' in response.text
+    async with borrow_client(cookies) as client:
+        response, page, found = await fetch_until(client, f"{GAME_URL}/village3.php?id={village_id}", until_marker('»building a new village'))
+        registry.record_action("tile")
+        return found
 
 # Find empty village spots and update the settlement file
 # Find empty village spots and update the settlement file
@@ -74,6 +79,9 @@ async def main():
 
     # Find empty village spots
     await find_empty_village_spots(cookies, potential_village_ids)
+    log_pool_stats()
+    log_stream_stats()
+    registry.dump()
 
     # Continue with your expansion logic here...
 